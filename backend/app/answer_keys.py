@@ -0,0 +1,146 @@
+import threading
+from array import array
+from bisect import bisect_left
+from typing import Dict, Iterable, Optional, Set, Tuple
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import models
+
+# Quiz ids remembered per topic as not belonging to it, so repeated stale or bogus ids cost no query
+ANSWER_KEYS_MAX_MISSING = 4096
+
+class TopicAnswerKey:
+    """Quiz ids and their correct options for one topic, as parallel sorted arrays"""
+
+    __slots__ = ("quiz_ids", "correct_options")
+
+    def __init__(self, rows: Iterable[Tuple[int, int]] = ()):
+        self.quiz_ids = array("q")
+        self.correct_options = array("i")
+        for quiz_id, correct_option in rows:
+            self.add(quiz_id, correct_option)
+
+    def add(self, quiz_id: int, correct_option: int) -> None:
+        # New quizzes nearly always have the highest id, so this is usually an append
+        if not self.quiz_ids or quiz_id > self.quiz_ids[-1]:
+            self.quiz_ids.append(quiz_id)
+            self.correct_options.append(correct_option)
+            return
+        i = bisect_left(self.quiz_ids, quiz_id)
+        if i < len(self.quiz_ids) and self.quiz_ids[i] == quiz_id:
+            self.correct_options[i] = correct_option
+            return
+        self.quiz_ids.insert(i, quiz_id)
+        self.correct_options.insert(i, correct_option)
+
+    def get(self, quiz_id: int) -> Optional[int]:
+        i = bisect_left(self.quiz_ids, quiz_id)
+        if i < len(self.quiz_ids) and self.quiz_ids[i] == quiz_id:
+            return self.correct_options[i]
+        return None
+
+    def __len__(self) -> int:
+        return len(self.quiz_ids)
+
+class AnswerKeyCache:
+    """Process-wide cache of per-topic answer keys used to grade submissions in memory"""
+
+    def __init__(self):
+        self._keys: Dict[int, TopicAnswerKey] = {}
+        self._missing: Dict[int, Set[int]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    async def _load(self, db: AsyncSession, topic_id: int) -> TopicAnswerKey:
+        rows = (await db.execute(
+            select(models.Quiz.id, models.Quiz.correct_option)
+            .where(models.Quiz.topic_id == topic_id)
+            .order_by(models.Quiz.id)
+        )).all()
+        key = TopicAnswerKey(rows)
+        with self._lock:
+            self._keys[topic_id] = key
+            self._missing.pop(topic_id, None)
+        return key
+
+    async def _fetch(self, db: AsyncSession, topic_id: int, quiz_ids: Set[int]) -> None:
+        # Looks up just these ids by primary key rather than reloading the whole topic
+        rows = (await db.execute(
+            select(models.Quiz.id, models.Quiz.correct_option)
+            .where(models.Quiz.topic_id == topic_id, models.Quiz.id.in_(quiz_ids))
+        )).all()
+        highest = await db.scalar(select(func.max(models.Quiz.id))) or 0
+        with self._lock:
+            key = self._keys.get(topic_id)
+            if key is None:
+                return
+            for quiz_id, correct_option in rows:
+                key.add(quiz_id, correct_option)
+            missing = self._missing.setdefault(topic_id, set())
+            if len(missing) >= ANSWER_KEYS_MAX_MISSING:
+                missing.clear()
+            # Ids above the highest quiz may still be created, so only lower ones are remembered
+            found = {quiz_id for quiz_id, _ in rows}
+            missing.update(i for i in quiz_ids - found if i <= highest)
+
+    async def lookup(self, db: AsyncSession, topic_id: int, quiz_ids: Iterable[int]) -> Dict[int, int]:
+        """Correct options for the given quiz ids; ids outside the topic are left out"""
+        quiz_ids = set(quiz_ids)
+        with self._lock:
+            key = self._keys.get(topic_id)
+            missing = self._missing.get(topic_id, set())
+            unknown = {i for i in quiz_ids if key is None or (key.get(i) is None and i not in missing)}
+
+        # Unknown ids may have been added by another worker process, so look them up before giving up
+        if key is None:
+            await self._load(db, topic_id)
+        elif unknown:
+            await self._fetch(db, topic_id, unknown)
+        with self._lock:
+            if key is None or unknown:
+                self.misses += 1
+            else:
+                self.hits += 1
+            key = self._keys.get(topic_id)
+            answers = {i: key.get(i) for i in quiz_ids} if key is not None else {}
+
+        return {i: v for i, v in answers.items() if v is not None}
+
+    def add(self, topic_id: int, quizzes: Iterable) -> None:
+        """Record newly committed quizzes; topics not loaded yet are left to lazy loading"""
+        with self._lock:
+            key = self._keys.get(topic_id)
+            if key is None:
+                return
+            missing = self._missing.get(topic_id, set())
+            for quiz in quizzes:
+                key.add(quiz.id, quiz.correct_option)
+                missing.discard(quiz.id)
+
+    def invalidate(self, topic_id: Optional[int] = None) -> None:
+        with self._lock:
+            if topic_id is None:
+                self._keys.clear()
+                self._missing.clear()
+            else:
+                self._keys.pop(topic_id, None)
+                self._missing.pop(topic_id, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "topics": len(self._keys),
+                "entries": sum(len(key) for key in self._keys.values()),
+                "known_missing": sum(len(missing) for missing in self._missing.values()),
+                "bytes": sum(
+                    key.quiz_ids.itemsize * len(key) + key.correct_options.itemsize * len(key)
+                    for key in self._keys.values()
+                ),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+answer_keys = AnswerKeyCache()
@@ -0,0 +1,197 @@
+"""
+Bulk import and export of topics, content and quizzes as NDJSON, one record per line:
+
+    {"type": "topic", "id": 1, "title": "Neural Networks", "description": "..."}
+    {"type": "content", "topic_id": 1, "summary_text": "..."}
+    {"type": "quiz", "topic_id": 1, "question": "...", "options": ["a", "b"], "correct_option": 0}
+
+A record's topic_id names a topic record earlier in the same file by its id,
+or an existing topic when the file has no topic with that id. Topics whose
+title already exists are reused rather than duplicated. From the backend directory:
+
+    python -m app.bulk import course.ndjson
+    python -m app.bulk export --types quiz --topic-id 3 > quiz_bank.ndjson
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Set
+from pydantic import ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import models, schemas
+
+# Rows per executemany; one batch per record type is held in memory at a time
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", "1000"))
+# Rows per transaction, so a large import neither holds the write lock throughout nor starts over on failure
+BULK_COMMIT_ROWS = int(os.getenv("BULK_COMMIT_ROWS", "20000"))
+# Line errors listed in the report; later ones are only counted
+BULK_MAX_REPORTED_ERRORS = 100
+
+RECORD_TYPES = ("topic", "content", "quiz")
+RECORD_SCHEMAS = {"topic": schemas.TopicCreate, "content": schemas.ContentCreate, "quiz": schemas.QuizCreate}
+TABLES = {"topic": models.Topic.__table__, "content": models.Content.__table__, "quiz": models.Quiz.__table__}
+EXPORT_COLUMNS = {
+    "topic": ("id", "title", "description"),
+    "content": ("topic_id", "summary_text"),
+    "quiz": ("topic_id", "question", "options", "correct_option"),
+}
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Split a byte stream into lines without holding more than one partial line"""
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line
+    if buffer:
+        yield buffer
+
+class _Importer:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+        # Topic ids used in the file -> database ids
+        self.topic_ids: Dict[int, int] = {}
+        self.existing_topic_ids: Set[int] = set()
+        self.pending: Dict[str, List[dict]] = {"content": [], "quiz": []}
+        self.touched: Set[str] = set()
+        self.uncommitted = 0
+        self.inserted = {kind: 0 for kind in RECORD_TYPES}
+
+    async def _topic(self, values: dict) -> int:
+        topic_id = await self.db.scalar(
+            select(models.Topic.id).where(models.Topic.title == values["title"]).order_by(models.Topic.id).limit(1)
+        )
+        if topic_id is None:
+            topic_id = (await self.db.execute(insert(models.Topic).values(**values).returning(models.Topic.id))).scalar_one()
+            self.inserted["topic"] += 1
+            self.touched.add("topics")
+            self.uncommitted += 1
+        return topic_id
+
+    async def _resolve_topic(self, topic_id: int) -> int:
+        if topic_id in self.topic_ids:
+            return self.topic_ids[topic_id]
+        if topic_id not in self.existing_topic_ids:
+            if await self.db.get(models.Topic, topic_id) is None:
+                raise ValueError(f"topic_id {topic_id} is neither a topic earlier in the file nor an existing topic")
+            self.existing_topic_ids.add(topic_id)
+        return topic_id
+
+    async def add(self, line: bytes) -> None:
+        record = json.loads(line)
+        if not isinstance(record, dict):
+            raise ValueError("Each line must be a JSON object")
+        kind = record.get("type")
+        if kind not in RECORD_SCHEMAS:
+            raise ValueError(f"type must be one of {list(RECORD_TYPES)}")
+        values = RECORD_SCHEMAS[kind].model_validate(record).model_dump()
+
+        if kind == "topic":
+            topic_id = await self._topic(values)
+            if isinstance(record.get("id"), int):
+                self.topic_ids[record["id"]] = topic_id
+            return
+        if kind == "quiz" and not 0 <= values["correct_option"] < len(values["options"]):
+            raise ValueError("correct_option must index into options")
+        values["topic_id"] = await self._resolve_topic(values["topic_id"])
+        self.pending[kind].append(values)
+        if len(self.pending[kind]) >= BULK_BATCH_SIZE:
+            await self._flush(kind)
+        if self.uncommitted >= BULK_COMMIT_ROWS:
+            await self.commit()
+
+    async def _flush(self, kind: str) -> None:
+        rows, self.pending[kind] = self.pending[kind], []
+        if not rows:
+            return
+        # A list of parameter sets runs as one executemany
+        await self.db.execute(insert(TABLES[kind]), rows)
+        self.inserted[kind] += len(rows)
+        self.touched.add(TABLES[kind].name)
+        self.uncommitted += len(rows)
+
+    async def commit(self) -> None:
+        for kind in self.pending:
+            await self._flush(kind)
+        # Core inserts skip the ORM flush hook, so ETags and the topic catalog need telling here
+        touched = set(self.touched)
+        await self.db.run_sync(lambda session: models.bump_table_versions(session.connection(), touched))
+        await self.db.commit()
+        self.touched.clear()
+        self.uncommitted = 0
+
+async def import_ndjson(db: AsyncSession, lines: AsyncIterator[bytes]) -> schemas.BulkImportReport:
+    """Insert the records in an NDJSON stream, skipping and reporting lines that do not validate"""
+    importer = _Importer(db)
+    errors: List[schemas.BulkImportError] = []
+    error_count = 0
+    line_number = 0
+    async for line in lines:
+        line_number += 1
+        if not line.strip():
+            continue
+        try:
+            await importer.add(line)
+        except (ValueError, ValidationError) as e:
+            error_count += 1
+            if len(errors) < BULK_MAX_REPORTED_ERRORS:
+                errors.append(schemas.BulkImportError(line=line_number, error=str(e)))
+    await importer.commit()
+    return schemas.BulkImportReport(
+        lines=line_number,
+        inserted=importer.inserted,
+        error_count=error_count,
+        errors=errors,
+    )
+
+async def export_ndjson(
+    db: AsyncSession, kinds: Iterable[str] = RECORD_TYPES, topic_id: Optional[int] = None
+) -> AsyncIterator[bytes]:
+    """Stream records as NDJSON, topics first so the output can be imported as is
+
+    Rows come from a streaming cursor in BULK_BATCH_SIZE partitions, so memory
+    stays flat however large the tables are.
+    """
+    for kind in RECORD_TYPES:
+        if kind not in kinds:
+            continue
+        table = TABLES[kind]
+        query = select(*(table.c[name] for name in EXPORT_COLUMNS[kind])).order_by(table.c.id)
+        if topic_id is not None:
+            query = query.where((table.c.id if kind == "topic" else table.c.topic_id) == topic_id)
+        result = await db.stream(query.execution_options(yield_per=BULK_BATCH_SIZE))
+        async for rows in result.mappings().partitions():
+            yield b"".join(json.dumps({"type": kind, **row}).encode() + b"\n" for row in rows)
+
+async def _read_file(path: str) -> AsyncIterator[bytes]:
+    with (sys.stdin.buffer if path == "-" else open(path, "rb")) as f:
+        for line in f:
+            yield line
+
+async def _main(args: argparse.Namespace) -> None:
+    models.create_tables()
+    async with models.AsyncSessionLocal() as db:
+        if args.command == "import":
+            report = await import_ndjson(db, _read_file(args.path))
+            print(report.model_dump_json(indent=2))
+        else:
+            async for chunk in export_ndjson(db, args.types.split(","), args.topic_id):
+                sys.stdout.buffer.write(chunk)
+    await models.async_engine.dispose()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    import_parser = commands.add_parser("import", help="Import an NDJSON file ('-' for stdin)")
+    import_parser.add_argument("path")
+    export_parser = commands.add_parser("export", help="Write NDJSON to stdout")
+    export_parser.add_argument("--types", default=",".join(RECORD_TYPES), help="Comma-separated record types")
+    export_parser.add_argument("--topic-id", type=int)
+    asyncio.run(_main(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
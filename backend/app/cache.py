@@ -0,0 +1,93 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+# Response cache settings
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1000"))
+RESPONSE_CACHE_TTL_SECONDS = int(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "3600"))
+
+_whitespace_re = re.compile(r"\s+")
+_punctuation_re = re.compile(r"[^\w\s]")
+
+def normalize_prompt(prompt: str) -> str:
+    """Collapse case, punctuation and whitespace so trivially different prompts share a key"""
+    text = _punctuation_re.sub(" ", prompt.lower())
+    return _whitespace_re.sub(" ", text).strip()
+
+class _Entry:
+    __slots__ = ("value", "expires_at")
+
+    def __init__(self, value: str, expires_at: float):
+        self.value = value
+        self.expires_at = expires_at
+
+class ResponseCache:
+    """Thread-safe LRU cache of LLM responses keyed on normalized prompts, with TTL expiry
+
+    Only exact (normalized) prompts hit; reusing answers to similar questions
+    is the deflector's job.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = RESPONSE_CACHE_MAX_ENTRIES,
+        ttl_seconds: float = RESPONSE_CACHE_TTL_SECONDS,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, namespace: str, prompt: str) -> Optional[str]:
+        key = f"{namespace}:{normalize_prompt(prompt)}"
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry.expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry.value
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def set(self, namespace: str, prompt: str, value: str) -> None:
+        if self.max_entries <= 0:
+            return
+        key = f"{namespace}:{normalize_prompt(prompt)}"
+        with self._lock:
+            self._entries[key] = _Entry(value, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def discard(self, namespace: str, prompt: str) -> None:
+        """Drop the response stored for exactly this prompt, e.g. one that turned out unusable"""
+        with self._lock:
+            self._entries.pop(f"{namespace}:{normalize_prompt(prompt)}", None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+response_cache = ResponseCache()
@@ -0,0 +1,219 @@
+import logging
+import os
+from datetime import datetime
+from typing import List, Optional, Set, Tuple
+from fastapi import HTTPException, Request, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import models, llm
+from .deflection import Deflection, deflector
+from .retrieval import format_context, retrieval_index
+
+logger = logging.getLogger(__name__)
+
+# Rough token budget for the summary plus recent turns sent with each prompt
+CONVERSATION_CONTEXT_TOKENS = int(os.getenv("CONVERSATION_CONTEXT_TOKENS", "2000"))
+# Turns that fell out of the window are folded into the summary once they add up to this much
+CONVERSATION_SUMMARY_TRIGGER_TOKENS = int(os.getenv("CONVERSATION_SUMMARY_TRIGGER_TOKENS", "500"))
+# Upper bound on rows read when assembling a prompt, whatever the budget
+CONVERSATION_WINDOW_MAX_MESSAGES = int(os.getenv("CONVERSATION_WINDOW_MAX_MESSAGES", "50"))
+
+# Conversations with a summarization already running
+_summarizing: Set[int] = set()
+
+def estimate_tokens(text: str) -> int:
+    """Approximate token count; about four characters per token for English text"""
+    return max(1, len(text) // 4)
+
+async def get_user_conversation(db: AsyncSession, conversation_id: int, user_id: int) -> models.Conversation:
+    """Load a conversation, answering 404 for ones that do not exist or belong to someone else"""
+    conversation = await db.get(models.Conversation, conversation_id)
+    if conversation is None or conversation.user_id != user_id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Conversation not found"
+        )
+    return conversation
+
+def _new_message(
+    conversation: models.Conversation,
+    role: str,
+    content: str,
+    created_at: Optional[datetime] = None
+) -> models.ConversationMessage:
+    return models.ConversationMessage(
+        conversation_id=conversation.id,
+        role=role,
+        content=content,
+        token_count=estimate_tokens(content),
+        created_at=created_at or datetime.utcnow()
+    )
+
+async def add_turn(
+    db: AsyncSession,
+    conversation: models.Conversation,
+    prompt: str,
+    answer: str,
+    asked_at: datetime
+) -> Tuple[models.ConversationMessage, models.ConversationMessage]:
+    """Store a student turn together with its answer, so a failed generation leaves no unanswered turn"""
+    user_message = _new_message(conversation, "user", prompt, asked_at)
+    assistant_message = _new_message(conversation, "assistant", answer)
+    conversation.updated_at = assistant_message.created_at
+    # Added in order, so the question also gets the lower id
+    db.add(user_message)
+    db.add(assistant_message)
+    await db.commit()
+    return user_message, assistant_message
+
+async def _unsummarized(
+    db: AsyncSession,
+    conversation: models.Conversation,
+    limit: Optional[int] = None
+) -> List[models.ConversationMessage]:
+    """Newest turns not yet covered by the summary, newest first"""
+    return (await db.scalars(
+        select(models.ConversationMessage)
+        .where(
+            models.ConversationMessage.conversation_id == conversation.id,
+            models.ConversationMessage.id > conversation.summarized_until_id
+        )
+        .order_by(models.ConversationMessage.created_at.desc(), models.ConversationMessage.id.desc())
+        .limit(limit)
+    )).all()
+
+def _split_window(conversation: models.Conversation, newest_first: List[models.ConversationMessage]) -> Tuple[list, list]:
+    """Split turns into the ones that fit the budget and the older ones that do not, both oldest first"""
+    budget = CONVERSATION_CONTEXT_TOKENS - estimate_tokens(conversation.summary or "")
+    window = []
+    for i, message in enumerate(newest_first):
+        if message.token_count > budget and window:
+            return window[::-1], newest_first[i:][::-1]
+        budget -= message.token_count
+        window.append(message)
+    return window[::-1], []
+
+async def load_window(db: AsyncSession, conversation: models.Conversation) -> List[models.ConversationMessage]:
+    window, _ = _split_window(conversation, await _unsummarized(db, conversation, CONVERSATION_WINDOW_MAX_MESSAGES))
+    return window
+
+def build_conversation_prompt(
+    conversation: models.Conversation,
+    window: List[models.ConversationMessage],
+    prompt: str,
+    context: List[dict] = ()
+) -> str:
+    """The tutor prompt with the summary and recent turns ahead of the new question"""
+    history = "\n".join(
+        f"{'Student' if message.role == 'user' else 'Tutor'}: {message.content}" for message in window
+    )
+    summary = f"Summary of the earlier conversation:\n{conversation.summary}\n\n" if conversation.summary else ""
+    return f"""
+        You are an AI tutor continuing a conversation with a student.
+
+        {summary}{format_context(context)}Recent conversation:
+        {history or "(none)"}
+
+        The student now asks:
+        {prompt}
+
+        Answer in the context of the conversation. Provide:
+        - Clear explanation
+        - Practical examples
+        - Key concepts
+        """
+
+def build_summary_prompt(summary: Optional[str], messages: List[models.ConversationMessage]) -> str:
+    turns = "\n".join(
+        f"{'Student' if message.role == 'user' else 'Tutor'}: {message.content}" for message in messages
+    )
+    return f"""
+        Update the running summary of a tutoring conversation with the turns below.
+        Keep the topics covered, what the student found difficult and any open questions.
+        Reply with the new summary only, in at most 150 words.
+
+        Current summary:
+        {summary or "(none)"}
+
+        New turns:
+        {turns}
+        """
+
+async def build_prompt(
+    db: AsyncSession,
+    conversation: models.Conversation,
+    prompt: str,
+    topic_id: Optional[int] = None
+) -> str:
+    """Assemble the prompt for the next turn from history and retrieved course material"""
+    window = await load_window(db, conversation)
+    context = await retrieval_index.search(db, prompt, topic_id=topic_id or conversation.topic_id)
+    return build_conversation_prompt(conversation, window, prompt, context)
+
+async def deflect_opening_turn(
+    db: AsyncSession,
+    conversation: models.Conversation,
+    prompt: str,
+    topic_id: Optional[int] = None
+) -> Optional[Deflection]:
+    """A stored answer for the first question of a conversation; follow-ups depend on history"""
+    has_history = await db.scalar(
+        select(models.ConversationMessage.id)
+        .where(models.ConversationMessage.conversation_id == conversation.id)
+        .limit(1)
+    )
+    if has_history is not None:
+        return None
+    return await deflector.deflect(db, prompt, topic_id or conversation.topic_id)
+
+async def reply(
+    request: Request,
+    db: AsyncSession,
+    conversation: models.Conversation,
+    prompt: str,
+    topic_id: Optional[int] = None
+) -> Tuple[models.ConversationMessage, models.ConversationMessage, Optional[Deflection]]:
+    """Store a student turn and the tutor's answer to it, given the conversation so far
+
+    Nothing is stored unless an answer is produced, so a timeout or disconnect
+    leaves the conversation as it was. `topic_id` scopes retrieval and
+    deflection, defaulting to the conversation's topic.
+    """
+    asked_at = datetime.utcnow()
+    deflection = await deflect_opening_turn(db, conversation, prompt, topic_id)
+    if deflection is not None:
+        response_text = deflection.answer
+    else:
+        full_prompt = await build_prompt(db, conversation, prompt, topic_id)
+        # Replies depend on the history, so they bypass the response cache entirely
+        response_text = await llm.cancel_on_disconnect(request, llm.registry.get().generate(full_prompt))
+    user_message, assistant_message = await add_turn(db, conversation, prompt, response_text, asked_at)
+    return user_message, assistant_message, deflection
+
+async def summarize_overflow(conversation_id: int) -> None:
+    """Fold turns that no longer fit the prompt window into the conversation summary"""
+    if conversation_id in _summarizing:
+        return
+    _summarizing.add(conversation_id)
+    try:
+        async with models.AsyncSessionLocal() as db:
+            conversation = await db.get(models.Conversation, conversation_id)
+            if conversation is None:
+                return
+            # Everything not yet summarized, so nothing is skipped past the row limit;
+            # this runs after every turn, so it stays a handful of rows
+            newest_first = await _unsummarized(db, conversation)
+            _, overflow = _split_window(conversation, newest_first[:CONVERSATION_WINDOW_MAX_MESSAGES])
+            overflow = newest_first[CONVERSATION_WINDOW_MAX_MESSAGES:][::-1] + overflow
+            if sum(message.token_count for message in overflow) < CONVERSATION_SUMMARY_TRIGGER_TOKENS:
+                return
+
+            conversation.summary = await llm.registry.get().generate(
+                build_summary_prompt(conversation.summary, overflow)
+            )
+            conversation.summarized_until_id = overflow[-1].id
+            await db.commit()
+    except Exception:
+        logger.exception("Summarizing conversation %s failed", conversation_id)
+    finally:
+        _summarizing.discard(conversation_id)
@@ -0,0 +1,182 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import List, NamedTuple, Optional, Tuple
+import numpy as np
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import models
+from .cache import RESPONSE_CACHE_TTL_SECONDS, normalize_prompt
+from .retrieval import RAG_SYNC_INTERVAL_SECONDS, VectorIndex, build_embedder
+
+DEFLECTION_ENABLED = os.getenv("DEFLECTION_ENABLED", "true").lower() == "true"
+# Cosine similarity a prompt needs with a topic title or an earlier question to be answered locally
+DEFLECTION_MIN_SCORE = float(os.getenv("DEFLECTION_MIN_SCORE", "0.75"))
+# Earlier Gemini answers kept for reuse; the least recently used go first once this many are held.
+# They expire with cached responses (RESPONSE_CACHE_TTL_SECONDS), so both serve answers equally fresh
+DEFLECTION_MAX_ANSWERS = int(os.getenv("DEFLECTION_MAX_ANSWERS", "10000"))
+
+class Deflection(NamedTuple):
+    answer: str
+    source: str  # "topic_explanation" or "previous_answer"
+    confidence: float
+
+class AnswerIndex:
+    """Fixed number of earlier questions with their answers, searched with one matrix-vector product
+
+    Slots are reused least recently used first, and answers older than the TTL
+    no longer match, so the index neither grows without bound nor keeps stale answers.
+    """
+
+    def __init__(self, capacity: int = DEFLECTION_MAX_ANSWERS, ttl_seconds: float = RESPONSE_CACHE_TTL_SECONDS):
+        self.capacity = capacity
+        self.ttl_seconds = ttl_seconds
+        self._vectors: Optional[np.ndarray] = None
+        self._topic_ids = np.zeros(capacity, dtype=np.int64)
+        self._expires_at = np.zeros(capacity, dtype=np.float64)
+        self._texts: List[Optional[str]] = [None] * capacity
+        self._keys: List[Optional[Tuple[int, str]]] = [None] * capacity
+        # (topic_id, normalized question) -> slot, least recently used first
+        self._slots: "OrderedDict[Tuple[int, str], int]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def add(self, question: str, topic_id: Optional[int], vector: np.ndarray, answer: str) -> None:
+        if self.capacity <= 0:
+            return
+        key = (topic_id or 0, normalize_prompt(question))
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.capacity, len(vector)), dtype=np.float32)
+            slot = self._slots.pop(key, None)
+            if slot is None:
+                if len(self._slots) < self.capacity:
+                    slot = len(self._slots)
+                else:
+                    _, slot = self._slots.popitem(last=False)
+                    self.evictions += 1
+            self._slots[key] = slot
+            self._keys[slot] = key
+            self._vectors[slot] = vector
+            self._topic_ids[slot] = topic_id or 0
+            self._texts[slot] = answer
+            self._expires_at[slot] = time.monotonic() + self.ttl_seconds
+
+    def search(self, vector: np.ndarray, topic_id: Optional[int], min_score: float) -> Optional[Tuple[str, float]]:
+        """The best unexpired answer recorded under the same topic (or none) scoring at least `min_score`, as (answer, score)"""
+        with self._lock:
+            used = len(self._slots)
+            if not used:
+                return None
+            # Vectors are unit length, so the dot product is the cosine similarity
+            scores = self._vectors[:used] @ vector
+            live = self._expires_at[:used] > time.monotonic()
+            # Answers drew on their topic's passages, so a general question only matches general answers
+            live &= self._topic_ids[:used] == (topic_id or 0)
+            scores = np.where(live, scores, -np.inf)
+            best = int(np.argmax(scores))
+            if scores[best] < min_score:
+                return None
+            self._slots.move_to_end(self._keys[best])
+            return self._texts[best], float(scores[best])
+
+class Deflector:
+    """Answers prompts that closely match a stored topic explanation or an earlier answer, skipping Gemini"""
+
+    def __init__(
+        self,
+        embedder=None,
+        min_score: float = DEFLECTION_MIN_SCORE,
+        max_answers: int = DEFLECTION_MAX_ANSWERS,
+        sync_interval: float = RAG_SYNC_INTERVAL_SECONDS,
+    ):
+        self.embedder = embedder
+        self.min_score = min_score
+        self.max_answers = max_answers
+        self.sync_interval = sync_interval
+        # Topic titles, matched to the topic's latest stored explanation
+        self._topics = VectorIndex(embedder)
+        # Earlier standalone questions, with Gemini's answer
+        self._answers = AnswerIndex(max_answers)
+        self._synced_until_topic_id = 0
+        self._last_sync = 0.0
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.deflected = 0
+        self.by_source = {"topic_explanation": 0, "previous_answer": 0}
+
+    async def add_topic(self, topic: models.Topic) -> None:
+        if self.embedder is None:
+            return
+        vector = await run_in_threadpool(self.embedder, topic.title)
+        self._topics.add_vectors(vector[None, :], [topic.title], topic.id, topic.id)
+
+    async def sync_topics(self, db: AsyncSession) -> None:
+        topics = (await db.scalars(
+            select(models.Topic)
+            .where(models.Topic.id > self._synced_until_topic_id)
+            .order_by(models.Topic.id)
+        )).all()
+        for topic in topics:
+            await self.add_topic(topic)
+            self._synced_until_topic_id = topic.id
+        self._last_sync = time.monotonic()
+
+    async def record_answer(self, prompt: str, topic_id: Optional[int], answer: str) -> None:
+        if self.embedder is None:
+            return
+        vector = await run_in_threadpool(self.embedder, prompt)
+        self._answers.add(prompt, topic_id, vector, answer)
+
+    async def deflect(self, db: AsyncSession, prompt: str, topic_id: Optional[int] = None) -> Optional[Deflection]:
+        """A stored answer for the prompt when one matches confidently enough, otherwise None"""
+        if self.embedder is None:
+            return None
+        if time.monotonic() - self._last_sync > self.sync_interval:
+            await self.sync_topics(db)
+        with self._lock:
+            self.requests += 1
+
+        vector = await run_in_threadpool(self.embedder, prompt)
+        best = None
+        hit = self._answers.search(vector, topic_id, self.min_score)
+        if hit is not None:
+            best = Deflection(hit[0], "previous_answer", round(hit[1], 3))
+        for hit in self._topics.search_vector(vector, 1, topic_id, self.min_score):
+            if best is not None and best.confidence >= hit["score"]:
+                continue
+            latest = await db.scalar(
+                select(models.Content)
+                .where(models.Content.topic_id == hit["topic_id"])
+                .order_by(models.Content.created_at.desc())
+                .limit(1)
+            )
+            if latest is not None:
+                best = Deflection(latest.summary_text, "topic_explanation", round(hit["score"], 3))
+
+        if best is not None:
+            with self._lock:
+                self.deflected += 1
+                self.by_source[best.source] += 1
+        return best
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "min_score": self.min_score,
+                "topics_indexed": len(self._topics),
+                "answers_indexed": len(self._answers),
+                "answer_ttl_seconds": self._answers.ttl_seconds,
+                "answer_evictions": self._answers.evictions,
+                "requests": self.requests,
+                "deflected": self.deflected,
+                "deflection_rate": self.deflected / self.requests if self.requests else 0.0,
+                "by_source": dict(self.by_source),
+            }
+
+deflector = Deflector(build_embedder() if DEFLECTION_ENABLED else None)
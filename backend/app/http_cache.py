@@ -0,0 +1,61 @@
+import os
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
+from fastapi import Request, Response, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import models
+
+# How long browsers may reuse a response before revalidating it; 0 revalidates every time
+HTTP_CACHE_MAX_AGE_SECONDS = int(os.getenv("HTTP_CACHE_MAX_AGE_SECONDS", "0"))
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    # GET uses weak comparison, so a W/ prefix added by a proxy still matches
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in candidates or etag in candidates
+
+def _not_modified_since(if_modified_since: str, last_modified: datetime) -> bool:
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    # HTTP dates have one-second resolution
+    return last_modified.replace(microsecond=0) <= since
+
+async def conditional_get(request: Request, response: Response, db: AsyncSession, *tables: str) -> Optional[Response]:
+    """Validators for a response built from `tables`, checked against the request's conditional headers
+
+    Sets ETag, Last-Modified and Cache-Control on `response` and returns a 304
+    to send instead when the client's copy is still current. Only the version
+    rows are read, so a 304 costs one primary-key lookup per table. The versions
+    the ETag was built from are left in `request.state.table_versions`, so a
+    body served from memory can be brought up to date with them.
+    """
+    rows = (await db.execute(
+        select(models.TableVersion.table_name, models.TableVersion.version, models.TableVersion.updated_at)
+        .where(models.TableVersion.table_name.in_(tables))
+    )).all()
+    versions = {row.table_name: row.version for row in rows}
+    request.state.table_versions = {table: versions.get(table, 0) for table in tables}
+    etag = '"' + "-".join(f"{table}.{version}" for table, version in request.state.table_versions.items()) + '"'
+    last_modified = max(
+        (row.updated_at for row in rows if row.updated_at is not None),
+        default=datetime(1970, 1, 1)
+    ).replace(tzinfo=timezone.utc)
+
+    headers = {
+        "ETag": etag,
+        "Last-Modified": format_datetime(last_modified, usegmt=True),
+        "Cache-Control": f"public, max-age={HTTP_CACHE_MAX_AGE_SECONDS}, must-revalidate",
+    }
+    response.headers.update(headers)
+
+    # If-None-Match takes precedence; If-Modified-Since only counts without it
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        not_modified = _etag_matches(if_none_match, etag)
+    else:
+        if_modified_since = request.headers.get("if-modified-since")
+        not_modified = if_modified_since is not None and _not_modified_since(if_modified_since, last_modified)
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers) if not_modified else None
@@ -0,0 +1,196 @@
+import asyncio
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from sortedcontainers import SortedList
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import models, schemas
+
+# How often a worker picks up rollup rows changed by other workers
+LEADERBOARD_SYNC_INTERVAL_SECONDS = float(os.getenv("LEADERBOARD_SYNC_INTERVAL_SECONDS", "10"))
+# Rows are re-read this far behind the watermark, since latest_at is set before the commit lands
+_SYNC_OVERLAP = timedelta(seconds=60)
+_EPOCH = datetime(1970, 1, 1)
+
+class Standing(NamedTuple):
+    best_percentage: float
+    attempts: int
+    latest_at: datetime
+
+class TopicLeaderboard:
+    """Users of one topic ordered by best percentage, then fewer attempts, then most recent attempt
+
+    Backed by a SortedList, so updates and rank lookups are O(log n).
+    """
+
+    def __init__(self):
+        self._ranked = SortedList()
+        self._standings: Dict[int, Standing] = {}
+
+    @staticmethod
+    def _key(user_id: int, standing: Standing) -> Tuple:
+        # Timestamps are naive UTC, so measure from a naive epoch rather than via local time
+        recency = (standing.latest_at - _EPOCH).total_seconds()
+        return (-standing.best_percentage, standing.attempts, -recency, user_id)
+
+    def load(self, standings: Dict[int, Standing]) -> None:
+        """Replace the whole board with one sort, much faster than adding users one at a time"""
+        self._standings = dict(standings)
+        self._ranked = SortedList(self._key(user_id, standing) for user_id, standing in standings.items())
+
+    def update(self, user_id: int, standing: Standing) -> None:
+        previous = self._standings.get(user_id)
+        if previous is not None:
+            self._ranked.remove(self._key(user_id, previous))
+        self._standings[user_id] = standing
+        self._ranked.add(self._key(user_id, standing))
+
+    def rank(self, user_id: int) -> Optional[int]:
+        """1-based position of the user, or None when they have no attempts"""
+        standing = self._standings.get(user_id)
+        if standing is None:
+            return None
+        return self._ranked.bisect_left(self._key(user_id, standing)) + 1
+
+    def standing(self, user_id: int) -> Optional[Standing]:
+        return self._standings.get(user_id)
+
+    def top(self, limit: int, offset: int = 0) -> List[Tuple[int, int, Standing]]:
+        """(rank, user_id, standing) for `limit` users starting at `offset`"""
+        return [
+            (offset + i + 1, key[-1], self._standings[key[-1]])
+            for i, key in enumerate(self._ranked.islice(offset, offset + limit))
+        ]
+
+    def __len__(self) -> int:
+        return len(self._ranked)
+
+class Leaderboards:
+    """Per-topic leaderboards kept in memory, built from user_topic_progress and updated on each submission"""
+
+    def __init__(self, sync_interval: float = LEADERBOARD_SYNC_INTERVAL_SECONDS):
+        self.sync_interval = sync_interval
+        self._boards: Dict[int, TopicLeaderboard] = {}
+        # Latest latest_at seen in the rollup table; rows changed after it are still to be read
+        self._synced_until: Optional[datetime] = None
+        self._last_sync = 0.0
+        self._lock = threading.Lock()
+        self._sync_lock = asyncio.Lock()
+        self.updates = 0
+        self.rank_lookups = 0
+
+    def record(self, user_id: int, topic_id: int, best_percentage: float, attempts: int, latest_at: datetime) -> None:
+        """Apply a committed rollup row"""
+        with self._lock:
+            board = self._boards.setdefault(topic_id, TopicLeaderboard())
+            current = board.standing(user_id)
+            # A concurrent sync may already hold a newer row for this user
+            if current is not None and current.attempts > attempts:
+                return
+            board.update(user_id, Standing(best_percentage, attempts, latest_at))
+            self.updates += 1
+            if self._synced_until is None or latest_at > self._synced_until:
+                self._synced_until = latest_at
+
+    async def load(self, db: AsyncSession) -> int:
+        """Rebuild every board from user_topic_progress"""
+        async with self._sync_lock:
+            standings: Dict[int, Dict[int, Standing]] = {}
+            synced_until = None
+            result = await db.stream(
+                select(
+                    models.UserTopicProgress.user_id,
+                    models.UserTopicProgress.topic_id,
+                    models.UserTopicProgress.best_percentage,
+                    models.UserTopicProgress.attempts,
+                    models.UserTopicProgress.latest_at,
+                ).execution_options(yield_per=10_000)
+            )
+            async for user_id, topic_id, best_percentage, attempts, latest_at in result:
+                standings.setdefault(topic_id, {})[user_id] = Standing(best_percentage, attempts, latest_at)
+                if synced_until is None or latest_at > synced_until:
+                    synced_until = latest_at
+            boards = {}
+            for topic_id, topic_standings in standings.items():
+                boards[topic_id] = TopicLeaderboard()
+                boards[topic_id].load(topic_standings)
+            with self._lock:
+                self._boards = boards
+                self._synced_until = synced_until
+            self._last_sync = time.monotonic()
+            return sum(len(topic_standings) for topic_standings in standings.values())
+
+    async def sync(self, db: AsyncSession) -> int:
+        """Apply rollup rows changed since the last sync or load"""
+        async with self._sync_lock:
+            query = select(
+                models.UserTopicProgress.user_id,
+                models.UserTopicProgress.topic_id,
+                models.UserTopicProgress.best_percentage,
+                models.UserTopicProgress.attempts,
+                models.UserTopicProgress.latest_at,
+            )
+            if self._synced_until is not None:
+                query = query.where(models.UserTopicProgress.latest_at >= self._synced_until - _SYNC_OVERLAP)
+            count = 0
+            result = await db.stream(query.execution_options(yield_per=10_000))
+            async for row in result:
+                self.record(*row)
+                count += 1
+            self._last_sync = time.monotonic()
+            return count
+
+    async def _sync_if_stale(self, db: AsyncSession) -> None:
+        if time.monotonic() - self._last_sync > self.sync_interval:
+            await self.sync(db)
+
+    async def _entries(self, db: AsyncSession, ranked: List[Tuple[int, int, Standing]]) -> List[schemas.LeaderboardEntry]:
+        user_ids = [user_id for _, user_id, _ in ranked]
+        names = dict((await db.execute(
+            select(models.User.id, models.User.name).where(models.User.id.in_(user_ids))
+        )).all()) if user_ids else {}
+        return [
+            schemas.LeaderboardEntry(
+                rank=rank,
+                user_id=user_id,
+                name=names.get(user_id, ""),
+                best_percentage=standing.best_percentage,
+                attempts=standing.attempts,
+                latest_at=standing.latest_at,
+            )
+            for rank, user_id, standing in ranked
+        ]
+
+    async def top(self, db: AsyncSession, topic_id: int, limit: int, offset: int = 0) -> schemas.Leaderboard:
+        await self._sync_if_stale(db)
+        with self._lock:
+            board = self._boards.get(topic_id)
+            ranked = board.top(limit, offset) if board is not None else []
+            total = len(board) if board is not None else 0
+        return schemas.Leaderboard(topic_id=topic_id, total_users=total, entries=await self._entries(db, ranked))
+
+    async def rank(self, db: AsyncSession, topic_id: int, user_id: int) -> Optional[schemas.LeaderboardEntry]:
+        await self._sync_if_stale(db)
+        with self._lock:
+            self.rank_lookups += 1
+            board = self._boards.get(topic_id)
+            position = board.rank(user_id) if board is not None else None
+            if position is None:
+                return None
+            ranked = [(position, user_id, board.standing(user_id))]
+        return (await self._entries(db, ranked))[0]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "topics": len(self._boards),
+                "entries": sum(len(board) for board in self._boards.values()),
+                "updates": self.updates,
+                "rank_lookups": self.rank_lookups,
+                "synced_until": self._synced_until,
+            }
+
+leaderboards = Leaderboards()
@@ -0,0 +1,276 @@
+import asyncio
+import os
+from abc import ABC, abstractmethod
+import threading
+import time
+from typing import AsyncIterator, Awaitable, Dict, List, Optional, TypeVar
+from fastapi import HTTPException, Request, status
+import google.generativeai as genai
+from dotenv import load_dotenv
+from .cache import response_cache
+
+# Load environment variables from the backend directory regardless of cwd
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENV_PATH = os.path.join(BACKEND_DIR, ".env")
+load_dotenv(ENV_PATH)
+
+GEMINI_MODEL_NAME = os.getenv("GEMINI_MODEL_NAME", "gemini-1.5-flash-8b")
+# Extra models to configure alongside the default, comma separated
+GEMINI_EXTRA_MODELS = [m.strip() for m in os.getenv("GEMINI_EXTRA_MODELS", "").split(",") if m.strip()]
+# "gemini" talks to the real API, "fake" serves canned answers for load tests
+GEMINI_CLIENT = os.getenv("GEMINI_CLIENT", "gemini")
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "16"))
+GEMINI_TIMEOUT_SECONDS = float(os.getenv("GEMINI_TIMEOUT_SECONDS", "60"))
+FAKE_GEMINI_LATENCY_SECONDS = float(os.getenv("FAKE_GEMINI_LATENCY_SECONDS", "0.5"))
+# Ask for JSON output (Gemini's JSON mode) where callers expect JSON and the SDK supports it
+GEMINI_JSON_MODE = os.getenv("GEMINI_JSON_MODE", "true").lower() == "true"
+
+T = TypeVar("T")
+
+class UsageStats:
+    """Per-model call counters"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.total_latency = 0.0
+
+    def record(self, latency: float, error: bool = False, timeout: bool = False) -> None:
+        with self._lock:
+            self.requests += 1
+            self.errors += int(error)
+            self.timeouts += int(timeout)
+            self.total_latency += latency
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "errors": self.errors,
+                "timeouts": self.timeouts,
+                "avg_latency_seconds": self.total_latency / self.requests if self.requests else 0.0,
+            }
+
+class LLMClient(ABC):
+    """Async text generation with bounded concurrency and per-call timeouts
+
+    Subclasses implement _generate and _stream; the public methods add the limits.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = GEMINI_MAX_CONCURRENCY,
+        timeout_seconds: float = GEMINI_TIMEOUT_SECONDS,
+    ):
+        self.timeout_seconds = timeout_seconds
+        self.usage = UsageStats()
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    @abstractmethod
+    async def _generate(self, prompt: str, json_output: bool = False) -> str:
+        ...
+
+    @abstractmethod
+    def _stream(self, prompt: str) -> AsyncIterator[str]:
+        ...
+
+    async def generate(self, prompt: str, json_output: bool = False) -> str:
+        """The model's text for a prompt; `json_output` asks for a bare JSON document where supported"""
+        async with self._semaphore:
+            started = time.monotonic()
+            try:
+                text = await asyncio.wait_for(self._generate(prompt, json_output), self.timeout_seconds)
+            except asyncio.TimeoutError:
+                self.usage.record(time.monotonic() - started, error=True, timeout=True)
+                raise HTTPException(
+                    status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+                    detail="Timed out waiting for Gemini"
+                )
+            except Exception:
+                self.usage.record(time.monotonic() - started, error=True)
+                raise
+            self.usage.record(time.monotonic() - started)
+            return text
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            started = loop.time()
+            deadline = started + self.timeout_seconds
+            iterator = self._stream(prompt).__aiter__()
+            try:
+                while True:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        raise asyncio.TimeoutError()
+                    try:
+                        chunk = await asyncio.wait_for(iterator.__anext__(), remaining)
+                    except StopAsyncIteration:
+                        break
+                    yield chunk
+            except asyncio.TimeoutError:
+                self.usage.record(loop.time() - started, error=True, timeout=True)
+                raise
+            except Exception:
+                self.usage.record(loop.time() - started, error=True)
+                raise
+            self.usage.record(loop.time() - started)
+
+class GeminiClient(LLMClient):
+    """Long-lived Gemini model handle sharing the SDK's pooled gRPC channel"""
+
+    def __init__(self, api_key: str, model_name: str = GEMINI_MODEL_NAME, **kwargs):
+        super().__init__(**kwargs)
+        genai.configure(api_key=api_key)
+        self.model = genai.GenerativeModel(model_name)
+        # response_mime_type only exists in SDK releases newer than the one pinned in requirements.txt
+        self.json_config = (
+            genai.GenerationConfig(response_mime_type="application/json")
+            if GEMINI_JSON_MODE and "response_mime_type" in getattr(genai.GenerationConfig, "__dataclass_fields__", {})
+            else None
+        )
+
+    async def _generate(self, prompt: str, json_output: bool = False) -> str:
+        if json_output and self.json_config is not None:
+            response = await self.model.generate_content_async(prompt, generation_config=self.json_config)
+        else:
+            response = await self.model.generate_content_async(prompt)
+        return response.text
+
+    async def _stream(self, prompt: str) -> AsyncIterator[str]:
+        response = await self.model.generate_content_async(prompt, stream=True)
+        async for chunk in response:
+            if chunk.text:
+                yield chunk.text
+
+class FakeGeminiClient(LLMClient):
+    """Offline stand-in that answers after a fixed delay, for load tests without network access"""
+
+    def __init__(self, latency_seconds: float = FAKE_GEMINI_LATENCY_SECONDS, **kwargs):
+        super().__init__(**kwargs)
+        self.latency_seconds = latency_seconds
+
+    def _answer(self, prompt: str) -> str:
+        if "JSON array" in prompt:
+            return (
+                '[{"question": "Which of these is a supervised learning task?", '
+                '"options": ["Classification", "Clustering", "Dimensionality reduction", "Anomaly detection"], '
+                '"correct_answer": "A", "explanation": "Classification learns from labeled examples."}]'
+            )
+        return f"This is a placeholder answer for: {' '.join(prompt.split())[:200]}"
+
+    async def _generate(self, prompt: str, json_output: bool = False) -> str:
+        await asyncio.sleep(self.latency_seconds)
+        return self._answer(prompt)
+
+    async def _stream(self, prompt: str) -> AsyncIterator[str]:
+        words = self._answer(prompt).split(" ")
+        delay = self.latency_seconds / max(len(words), 1)
+        for i, word in enumerate(words):
+            await asyncio.sleep(delay)
+            yield word if i == 0 else f" {word}"
+
+class ModelRegistry:
+    """Configured model handles keyed by model name, built once and reused by every request"""
+
+    def __init__(self):
+        self.default_model = GEMINI_MODEL_NAME
+        self._clients: Dict[str, LLMClient] = {}
+        self._lock = threading.Lock()
+
+    def _model_names(self) -> List[str]:
+        return [self.default_model] + [m for m in GEMINI_EXTRA_MODELS if m != self.default_model]
+
+    def init(self) -> None:
+        """Configure every model from the current environment, replacing existing handles"""
+        names = self._model_names()
+        if GEMINI_CLIENT == "fake":
+            clients = {name: FakeGeminiClient() for name in names}
+        else:
+            api_key = os.getenv("GEMINI_API_KEY")
+            clients = {name: GeminiClient(api_key, name) for name in names} if api_key else {}
+        with self._lock:
+            # Keep usage history across credential reloads
+            for name, client in clients.items():
+                if name in self._clients:
+                    client.usage = self._clients[name].usage
+            self._clients = clients
+
+    def reload(self) -> None:
+        """Re-read .env so rotated credentials take effect without a restart"""
+        load_dotenv(ENV_PATH, override=True)
+        self.init()
+
+    def register(self, name: str, client: LLMClient) -> None:
+        """Install a client by hand, e.g. a FakeGeminiClient in load tests"""
+        with self._lock:
+            self._clients[name] = client
+
+    def is_configured(self) -> bool:
+        return self.default_model in self._clients
+
+    def get(self, name: Optional[str] = None) -> LLMClient:
+        client = self._clients.get(name or self.default_model)
+        if client is None:
+            if name and name != self.default_model:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail=f"Model {name} is not configured"
+                )
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="GEMINI_API_KEY not found in environment variables"
+            )
+        return client
+
+    def stats(self) -> dict:
+        with self._lock:
+            clients = dict(self._clients)
+        return {
+            "default_model": self.default_model,
+            "models": {
+                name: {"client": type(client).__name__, **client.usage.as_dict()}
+                for name, client in clients.items()
+            },
+        }
+
+registry = ModelRegistry()
+
+async def generate_text(
+    prompt: str,
+    namespace: str,
+    use_cache: bool = True,
+    cache_key: Optional[str] = None,
+    json_output: bool = False
+) -> str:
+    """Return the model's text for a prompt, serving repeats from the response cache"""
+    cache_key = cache_key or prompt
+    if use_cache:
+        cached = response_cache.get(namespace, cache_key)
+        if cached is not None:
+            return cached
+    
+    text = await registry.get().generate(prompt, json_output)
+    
+    response_cache.set(namespace, cache_key, text)
+    return text
+
+async def cancel_on_disconnect(request: Request, awaitable: Awaitable[T], poll_interval: float = 0.5) -> T:
+    """Await an upstream call, cancelling it if the HTTP client goes away first"""
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=poll_interval)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                task.cancel()
+                raise HTTPException(
+                    status_code=499,
+                    detail="Client disconnected"
+                )
+    finally:
+        if not task.done():
+            task.cancel()
@@ -1,15 +1,55 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
-from app.routes import auth, topics, quiz, gemini
-from app.models import create_tables
+from app.routes import auth, topics, quiz, gemini, conversations, search, bulk
+from app.models import AsyncSessionLocal, async_engine, create_tables, engine
+from app import llm
+from app.deflection import DEFLECTION_ENABLED, deflector
+from app.pagination import NEXT_AFTER_ID_HEADER
+from app.leaderboard import leaderboards
+from app.passwords import password_hasher
+from app.progress import backfill_progress
+from app.quiz_jobs import quiz_jobs
+from app.quiz_pool import QUIZ_POOL_ENABLED, quiz_pool
+from app.retrieval import RAG_ENABLED, retrieval_index
+from app.search import create_search_index
+from app.topic_catalog import topic_catalog
 import uvicorn
 
+# Create database tables, configure Gemini models and start background workers
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    create_tables()
+    create_search_index(engine)
+    backfill_progress(engine)
+    llm.registry.init()
+    password_hasher.start()
+    # Load the topic catalog and index existing course material and topics;
+    # later rows are added as they are written
+    async with AsyncSessionLocal() as db:
+        await topic_catalog.load(db)
+        await leaderboards.load(db)
+        if RAG_ENABLED:
+            await retrieval_index.sync(db)
+        if DEFLECTION_ENABLED:
+            await deflector.sync_topics(db)
+    if QUIZ_POOL_ENABLED:
+        await quiz_pool.start(warm=llm.registry.is_configured())
+    # Unfinished quiz jobs carry on where the last run stopped
+    await quiz_jobs.start(resume=llm.registry.is_configured())
+    yield
+    await quiz_jobs.stop()
+    await quiz_pool.stop()
+    password_hasher.stop()
+    await async_engine.dispose()
+
 # Create FastAPI app
 app = FastAPI(
     title="AI Learning Companion API",
     description="A chatbot API for learning AI/ML concepts with Gemini Pro",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configure CORS
@@ -19,6 +59,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_AFTER_ID_HEADER],
 )
 
 # Include routers
@@ -26,11 +67,9 @@ app.include_router(auth.router)
 app.include_router(topics.router)
 app.include_router(quiz.router)
 app.include_router(gemini.router)
-
-# Create database tables on startup
-@app.on_event("startup")
-async def startup_event():
-    create_tables()
+app.include_router(conversations.router)
+app.include_router(search.router)
+app.include_router(bulk.router)
 
 # Root endpoint
 @app.get("/")
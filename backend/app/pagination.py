@@ -0,0 +1,81 @@
+import os
+from typing import List, NamedTuple, Optional, Sequence, Type
+from fastapi import HTTPException, Query, Response, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+PAGE_MAX_LIMIT = int(os.getenv("PAGE_MAX_LIMIT", "500"))
+# Response header carrying the cursor for the next page; absent on the last page
+NEXT_AFTER_ID_HEADER = "X-Next-After-Id"
+
+class PageParams:
+    """Query parameters shared by the paginated list endpoints
+
+    Without `limit` the endpoint answers with every row after `after_id`, as it
+    did before pagination, so existing clients keep seeing complete lists.
+    """
+
+    def __init__(
+        self,
+        after_id: Optional[int] = Query(None, ge=0, description="Return rows with a larger id than this"),
+        limit: Optional[int] = Query(None, ge=1, le=PAGE_MAX_LIMIT, description="Page size; omit for every row"),
+        fields: Optional[str] = Query(None, description="Comma-separated fields to return; id is always included"),
+    ):
+        self.after_id = after_id
+        self.limit = limit
+        self.fields = fields
+
+class Page(NamedTuple):
+    rows: List[dict]
+    next_after_id: Optional[int]
+    projected: bool
+
+def select_fields(fields: Optional[str], schema: Type[BaseModel]) -> List[str]:
+    """Columns to load: every field of the response schema, or the requested subset of them"""
+    available = list(schema.model_fields)
+    if not fields:
+        return available
+    requested = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = sorted(set(requested) - set(available))
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields {unknown}; choose from {available}"
+        )
+    return list(dict.fromkeys(["id", *requested]))
+
+async def fetch_page(db: AsyncSession, model, schema: Type[BaseModel], params: PageParams, *criteria) -> Page:
+    """One page of `model` rows matching `criteria`, in id order, loading only the selected columns"""
+    names = select_fields(params.fields, schema)
+    query = select(*(getattr(model, name) for name in names)).where(*criteria)
+    if params.after_id is not None:
+        query = query.where(model.id > params.after_id)
+    query = query.order_by(model.id)
+    if params.limit is None:
+        rows = (await db.execute(query)).mappings().all()
+        return Page([dict(row) for row in rows], None, bool(params.fields))
+    # One extra row says whether another page follows without a COUNT query
+    rows = (await db.execute(query.limit(params.limit + 1))).mappings().all()
+    next_after_id = rows[params.limit - 1]["id"] if len(rows) > params.limit else None
+    return Page([dict(row) for row in rows[:params.limit]], next_after_id, bool(params.fields))
+
+def page_of(items: Sequence[BaseModel], schema: Type[BaseModel], params: PageParams) -> Page:
+    """The page fetch_page would return, cut from schema objects already in memory in id order"""
+    names = select_fields(params.fields, schema)
+    remaining = [item for item in items if params.after_id is None or item.id > params.after_id]
+    limit = len(remaining) if params.limit is None else params.limit
+    rows = [item.model_dump(include=set(names)) for item in remaining[:limit]]
+    next_after_id = rows[-1]["id"] if len(remaining) > limit else None
+    return Page(rows, next_after_id, bool(params.fields))
+
+def page_response(response: Response, page: Page):
+    """Return value for a paginated route, with the next-page cursor as a header"""
+    if page.next_after_id is not None:
+        response.headers[NEXT_AFTER_ID_HEADER] = str(page.next_after_id)
+    if page.projected:
+        # A projection leaves out fields the response model requires, so skip its validation
+        return JSONResponse(jsonable_encoder(page.rows), headers=dict(response.headers))
+    return page.rows
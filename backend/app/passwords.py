@@ -0,0 +1,96 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional, Tuple
+from . import auth
+
+# "thread" or "process"; bcrypt releases the GIL, so threads already run in parallel
+PASSWORD_HASH_EXECUTOR = os.getenv("PASSWORD_HASH_EXECUTOR", "thread").lower()
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 1)))
+# Hashing requests allowed to wait for a worker before new ones are turned away
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "256"))
+
+class PasswordHasherBusy(Exception):
+    pass
+
+class PasswordHasher:
+    """Runs bcrypt on a dedicated, bounded pool so it never holds the request threadpool"""
+
+    def __init__(
+        self,
+        executor: str = PASSWORD_HASH_EXECUTOR,
+        workers: int = PASSWORD_HASH_WORKERS,
+        max_queue: int = PASSWORD_HASH_MAX_QUEUE,
+    ):
+        if executor not in ("thread", "process"):
+            raise ValueError(f"Unknown password hash executor: {executor}")
+        self.executor = executor
+        self.workers = workers
+        self.max_queue = max_queue
+        self._pool: Optional[Executor] = None
+        self._waiting = 0
+        self._lock = threading.Lock()
+        self.hashes = 0
+        self.verifications = 0
+        self.rehashes = 0
+        self.rejected = 0
+
+    def start(self) -> None:
+        if self._pool is not None:
+            return
+        if self.executor == "process":
+            # spawn, not fork: the parent already runs event loop and driver threads
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        else:
+            self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix="bcrypt")
+
+    def stop(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+    async def _run(self, fn, *args):
+        if self._pool is None:
+            self.start()
+        with self._lock:
+            if self._waiting >= self.workers + self.max_queue:
+                self.rejected += 1
+                raise PasswordHasherBusy()
+            self._waiting += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._pool, fn, *args)
+        finally:
+            with self._lock:
+                self._waiting -= 1
+
+    async def hash(self, password: str) -> str:
+        hashed = await self._run(auth.get_password_hash, password)
+        with self._lock:
+            self.hashes += 1
+        return hashed
+
+    async def verify_and_update(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """Check a password; the second item is a fresh hash when the stored one uses outdated settings"""
+        valid, new_hash = await self._run(auth.verify_and_update_password, password, hashed_password)
+        with self._lock:
+            self.verifications += 1
+            if new_hash is not None:
+                self.rehashes += 1
+        return valid, new_hash
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "executor": self.executor,
+                "workers": self.workers,
+                "bcrypt_rounds": auth.BCRYPT_ROUNDS,
+                "in_flight": self._waiting,
+                "hashes": self.hashes,
+                "verifications": self.verifications,
+                "rehashes": self.rehashes,
+                "rejected": self.rejected,
+            }
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,114 @@
+from datetime import datetime
+from sqlalchemy import Engine, Row, case, select, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import models, schemas
+
+# Dialects with INSERT ... ON CONFLICT, which keeps concurrent first attempts from colliding
+_UPSERT_INSERTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+
+# Rebuilds rollups from user_scores rows recorded before the rollup table existed.
+# Ties for best go to the later attempt, as in record_attempt
+BACKFILL_PROGRESS = text("""
+    WITH attempts AS (
+        SELECT id, user_id, topic_id, score, total_questions, timestamp,
+               CASE WHEN total_questions > 0 THEN score * 100.0 / total_questions ELSE 0.0 END AS percentage
+        FROM user_scores
+    ), ranked AS (
+        SELECT attempts.*,
+               row_number() OVER (PARTITION BY user_id, topic_id ORDER BY percentage DESC, timestamp DESC, id DESC) AS best_rank,
+               row_number() OVER (PARTITION BY user_id, topic_id ORDER BY timestamp DESC, id DESC) AS latest_rank,
+               count(*) OVER (PARTITION BY user_id, topic_id) AS attempt_count,
+               sum(percentage) OVER (PARTITION BY user_id, topic_id) AS percentage_sum
+        FROM attempts
+    )
+    INSERT INTO user_topic_progress (
+        user_id, topic_id, attempts, percentage_sum, best_score, best_total_questions, best_percentage,
+        latest_score, latest_total_questions, latest_at
+    )
+    SELECT best.user_id, best.topic_id, best.attempt_count, best.percentage_sum,
+           best.score, best.total_questions, best.percentage,
+           latest.score, latest.total_questions, latest.timestamp
+    FROM ranked AS best
+    JOIN ranked AS latest
+      ON latest.user_id = best.user_id AND latest.topic_id = best.topic_id AND latest.latest_rank = 1
+    WHERE best.best_rank = 1
+    ON CONFLICT (user_id, topic_id) DO NOTHING
+""")
+
+def percentage(score: int, total_questions: int) -> float:
+    return score * 100.0 / total_questions if total_questions else 0.0
+
+def backfill_progress(engine: Engine) -> None:
+    """Fill user_topic_progress from existing scores when it is still empty"""
+    with engine.begin() as conn:
+        if conn.execute(select(models.UserTopicProgress.user_id).limit(1)).first() is not None:
+            return
+        if conn.execute(select(models.UserScore.id).limit(1)).first() is None:
+            return
+        conn.execute(BACKFILL_PROGRESS)
+
+async def record_attempt(db: AsyncSession, score: models.UserScore) -> Row:
+    """Fold a new attempt into the user's rollup for its topic, in the caller's transaction; returns the updated row"""
+    progress = models.UserTopicProgress.__table__
+    attempt_percentage = percentage(score.score, score.total_questions)
+    statement = _UPSERT_INSERTS[db.bind.dialect.name](progress).values(
+        user_id=score.user_id,
+        topic_id=score.topic_id,
+        attempts=1,
+        percentage_sum=attempt_percentage,
+        best_score=score.score,
+        best_total_questions=score.total_questions,
+        best_percentage=attempt_percentage,
+        latest_score=score.score,
+        latest_total_questions=score.total_questions,
+        latest_at=score.timestamp or datetime.utcnow(),
+    )
+    new = statement.excluded
+    # SET expressions all see the row as it was before this update
+    improved = new.best_percentage >= progress.c.best_percentage
+    result = await db.execute(statement.on_conflict_do_update(
+        index_elements=[progress.c.user_id, progress.c.topic_id],
+        set_={
+            "attempts": progress.c.attempts + 1,
+            "percentage_sum": progress.c.percentage_sum + new.percentage_sum,
+            "best_score": case((improved, new.best_score), else_=progress.c.best_score),
+            "best_total_questions": case((improved, new.best_total_questions), else_=progress.c.best_total_questions),
+            "best_percentage": case((improved, new.best_percentage), else_=progress.c.best_percentage),
+            "latest_score": new.latest_score,
+            "latest_total_questions": new.latest_total_questions,
+            "latest_at": new.latest_at,
+        }
+    ).returning(progress))
+    return result.one()
+
+async def summarize(db: AsyncSession, user_id: int) -> schemas.ProgressSummary:
+    """Per-topic best, latest and average for a user, read from the rollup table only"""
+    rows = (await db.scalars(
+        select(models.UserTopicProgress)
+        .where(models.UserTopicProgress.user_id == user_id)
+        .order_by(models.UserTopicProgress.topic_id)
+    )).all()
+    topics = [
+        schemas.TopicProgress(
+            topic_id=row.topic_id,
+            attempts=row.attempts,
+            average_percentage=row.percentage_sum / row.attempts,
+            best_score=row.best_score,
+            best_total_questions=row.best_total_questions,
+            best_percentage=row.best_percentage,
+            latest_score=row.latest_score,
+            latest_total_questions=row.latest_total_questions,
+            latest_percentage=percentage(row.latest_score, row.latest_total_questions),
+            latest_at=row.latest_at,
+        )
+        for row in rows
+    ]
+    return schemas.ProgressSummary(
+        topics=topics,
+        topics_attempted=len(topics),
+        total_attempts=sum(topic.attempts for topic in topics),
+        average_latest_percentage=(
+            sum(topic.latest_percentage for topic in topics) / len(topics) if topics else 0.0
+        ),
+    )
@@ -0,0 +1,191 @@
+import json
+import logging
+import threading
+from typing import Any, List, NamedTuple
+from fastapi import HTTPException, status
+from . import llm, schemas
+from .cache import response_cache
+
+logger = logging.getLogger(__name__)
+
+def build_quiz_prompt(topic: schemas.Topic, num_questions: int) -> str:
+    return f"""
+        Generate {num_questions} multiple choice questions about {topic.title}.
+        Topic description: {topic.description}
+
+        For each question, provide:
+        1. A clear question
+        2. Four answer options (A, B, C, D)
+        3. The correct answer (A, B, C, or D)
+        4. A brief explanation of why the answer is correct
+
+        Format your response as a JSON array with this structure:
+        [
+            {{
+                "question": "What is...",
+                "options": ["Option A", "Option B", "Option C", "Option D"],
+                "correct_answer": "A",
+                "explanation": "This is correct because..."
+            }}
+        ]
+
+        Make sure the questions are educational and test understanding of key concepts.
+        """
+
+class ParsedQuiz(NamedTuple):
+    questions: List[dict]
+    # Why each element of the output that did not become a question was dropped
+    rejects: List[str]
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\r\n"
+
+def _correct_index(answer: Any, options: List[str]) -> int:
+    """Index of the correct option from a letter ("B", "b)", "B. ..."), the option text or a 0-based index
+
+    A lone letter is read as a letter first, so "C" picks the third option even
+    when another option's text is "C". Longer answers match option text first,
+    and count as a letter only in the forms "B)", "B." and "B:".
+    """
+    if isinstance(answer, bool):
+        raise ValueError("correct_answer must be a letter")
+    if isinstance(answer, int):
+        index = answer
+    elif isinstance(answer, str):
+        answer = answer.strip()
+        letter = answer[:1].upper()
+        is_letter = letter.isalpha() and (len(answer) == 1 or answer[1] in ").:")
+        index = ord(letter) - ord("A") if is_letter else -1
+        if len(answer) == 1 and 0 <= index < len(options):
+            return index
+        if answer in options:
+            return options.index(answer)
+        if not is_letter:
+            raise ValueError(f"correct_answer {answer[:20]!r} is not an option letter")
+    else:
+        raise ValueError("correct_answer must be a letter")
+    if not 0 <= index < len(options):
+        raise ValueError(f"correct_answer {answer!r} is not one of the {len(options)} options")
+    return index
+
+def _question_values(item: Any) -> dict:
+    """Quiz column values for one generated question, or ValueError saying what is wrong with it"""
+    if not isinstance(item, dict):
+        raise ValueError(f"expected an object, got {type(item).__name__}")
+    missing = [key for key in ("question", "options", "correct_answer") if key not in item]
+    if missing:
+        raise ValueError(f"missing {', '.join(missing)}")
+    question = item["question"]
+    if not isinstance(question, str) or not question.strip():
+        raise ValueError("question must be non-empty text")
+    options = item["options"]
+    if not isinstance(options, list) or len(options) < 2 or not all(isinstance(o, (str, int, float)) for o in options):
+        raise ValueError("options must be a list of at least two answers")
+    options = [str(option).strip() for option in options]
+    return {
+        "question": question.strip(),
+        "options": options,
+        "correct_option": _correct_index(item["correct_answer"], options),
+    }
+
+def _array_start(text: str) -> int:
+    """Position just inside the question array: the first [ that opens an object list"""
+    position = text.find("[")
+    while position != -1:
+        following = text[position + 1:].lstrip(_WHITESPACE)[:1]
+        if following in ("{", "]"):
+            return position + 1
+        position = text.find("[", position + 1)
+    return -1
+
+def parse_quiz_output(response_text: str) -> ParsedQuiz:
+    """Decode the model's question array one element at a time, keeping every valid question
+
+    Each element is decoded on its own with raw_decode, so a malformed or
+    truncated element costs only that question: parsing resumes at the next
+    object. Surrounding prose, code fences and a wrapping object are ignored.
+    """
+    questions: List[dict] = []
+    rejects: List[str] = []
+    position = _array_start(response_text)
+    if position == -1:
+        return ParsedQuiz(questions, ["no JSON array of questions in the response"])
+
+    length = len(response_text)
+    while True:
+        while position < length and response_text[position] in _WHITESPACE + ",":
+            position += 1
+        # A missing ] means the output was cut off after a complete element; keep what came before
+        if position >= length or response_text[position] == "]":
+            break
+        try:
+            item, position = _decoder.raw_decode(response_text, position)
+        except json.JSONDecodeError as e:
+            rejects.append(f"element {len(questions) + len(rejects) + 1}: malformed JSON ({e.msg})")
+            # Resume at the next object; anything inside the broken one fails validation below
+            position = response_text.find("{", position + 1)
+            if position == -1:
+                break
+            continue
+        try:
+            questions.append(_question_values(item))
+        except ValueError as e:
+            rejects.append(f"element {len(questions) + len(rejects) + 1}: {e}")
+    return ParsedQuiz(questions, rejects)
+
+class ParseStats:
+    """Counters of generated questions kept and dropped"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.responses = 0
+        self.unusable_responses = 0
+        self.questions = 0
+        self.rejects = 0
+
+    def record(self, parsed: ParsedQuiz) -> None:
+        with self._lock:
+            self.responses += 1
+            self.unusable_responses += int(not parsed.questions)
+            self.questions += len(parsed.questions)
+            self.rejects += len(parsed.rejects)
+
+    def stats(self) -> dict:
+        with self._lock:
+            elements = self.questions + self.rejects
+            return {
+                "responses": self.responses,
+                "unusable_responses": self.unusable_responses,
+                "questions": self.questions,
+                "rejects": self.rejects,
+                "reject_ratio": self.rejects / elements if elements else 0.0,
+            }
+
+parse_stats = ParseStats()
+
+def parse_questions(response_text: str) -> List[dict]:
+    """Turn the model's JSON output into Quiz column values, dropping questions that do not validate"""
+    parsed = parse_quiz_output(response_text)
+    parse_stats.record(parsed)
+    if parsed.rejects:
+        logger.warning(
+            "Kept %d generated questions, dropped %d: %s",
+            len(parsed.questions), len(parsed.rejects), "; ".join(parsed.rejects[:5])
+        )
+    if not parsed.questions:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error parsing generated quiz: {'; '.join(parsed.rejects[:5]) or 'no questions in the response'}"
+        )
+    return parsed.questions
+
+async def generate_questions(topic: schemas.Topic, num_questions: int, use_cache: bool = True) -> List[dict]:
+    """Ask Gemini for quiz questions about a topic"""
+    prompt = build_quiz_prompt(topic, num_questions)
+    response_text = await llm.generate_text(prompt, "quiz", use_cache, json_output=True)
+    try:
+        return parse_questions(response_text)
+    except HTTPException:
+        # Do not serve an unusable generation again from the cache
+        response_cache.discard("quiz", prompt)
+        raise
@@ -0,0 +1,473 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, List, NamedTuple, Optional, Sequence, Set
+from fastapi import HTTPException, status
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import llm, models, schemas
+from .answer_keys import answer_keys
+from .quiz_generation import generate_questions
+from .topic_catalog import topic_catalog
+
+logger = logging.getLogger(__name__)
+
+# Gemini calls in flight for quiz jobs; keep below GEMINI_MAX_CONCURRENCY so interactive requests get a share
+QUIZ_JOBS_CONCURRENCY = int(os.getenv("QUIZ_JOBS_CONCURRENCY", "4"))
+# Gemini calls started per minute for quiz jobs; 0 turns the limit off
+QUIZ_JOBS_RATE_PER_MINUTE = float(os.getenv("QUIZ_JOBS_RATE_PER_MINUTE", "60"))
+QUIZ_JOBS_MAX_ATTEMPTS = int(os.getenv("QUIZ_JOBS_MAX_ATTEMPTS", "3"))
+# Delay before the first retry of a topic; doubles with each further attempt
+QUIZ_JOBS_RETRY_DELAY_SECONDS = float(os.getenv("QUIZ_JOBS_RETRY_DELAY_SECONDS", "2"))
+# Finished topics are written in one transaction once this many are waiting, or after the delay
+QUIZ_JOBS_WRITE_BATCH_SIZE = int(os.getenv("QUIZ_JOBS_WRITE_BATCH_SIZE", "20"))
+QUIZ_JOBS_WRITE_DELAY_SECONDS = float(os.getenv("QUIZ_JOBS_WRITE_DELAY_SECONDS", "0.5"))
+# A running task left unfinished this long (its worker went away) is claimed again
+QUIZ_JOBS_LEASE_SECONDS = int(os.getenv("QUIZ_JOBS_LEASE_SECONDS", "600"))
+# How often each worker looks for pending tasks and lapsed claims to take over
+QUIZ_JOBS_RESCAN_SECONDS = float(os.getenv("QUIZ_JOBS_RESCAN_SECONDS", "60"))
+# How often a progress stream re-reads a job whose tasks run on another worker
+QUIZ_JOBS_POLL_SECONDS = float(os.getenv("QUIZ_JOBS_POLL_SECONDS", "2"))
+QUIZ_JOBS_MAX_TOPICS = 200
+QUIZ_JOBS_MAX_QUESTIONS = 50
+
+Task = models.QuizGenerationTask
+Job = models.QuizGenerationJob
+
+class RateLimiter:
+    """Spaces calls evenly at `rate_per_minute`"""
+
+    def __init__(self, rate_per_minute: float):
+        self.interval = 60.0 / rate_per_minute if rate_per_minute > 0 else 0.0
+        self._next = 0.0
+
+    async def acquire(self) -> None:
+        if not self.interval:
+            return
+        # Reserve the next free slot before sleeping, so concurrent callers queue up behind it
+        now = time.monotonic()
+        slot = max(now, self._next)
+        self._next = slot + self.interval
+        await asyncio.sleep(slot - now)
+
+class _Work(NamedTuple):
+    task_id: int
+    job_id: int
+    topic_id: int
+    num_questions: int
+    use_cache: bool
+
+class _Outcome(NamedTuple):
+    work: _Work
+    attempts: int
+    questions: List[dict]
+    error: Optional[str]
+
+def _claimable():
+    lapsed = datetime.utcnow() - timedelta(seconds=QUIZ_JOBS_LEASE_SECONDS)
+    return or_(Task.status == "pending", and_(Task.status == "running", Task.claimed_at < lapsed))
+
+def _summarize(job: models.QuizGenerationJob, tasks: Sequence[models.QuizGenerationTask]) -> schemas.QuizJob:
+    counts = Counter(task.status for task in tasks)
+    if counts["pending"] + counts["running"] == 0:
+        job_status = "failed" if counts["failed"] else "done"
+    elif counts["pending"] == len(tasks):
+        job_status = "pending"
+    else:
+        job_status = "running"
+    return schemas.QuizJob(
+        id=job.id,
+        status=job_status,
+        total=len(tasks),
+        done=counts["done"],
+        failed=counts["failed"],
+        questions_generated=sum(task.generated for task in tasks),
+        created_at=job.created_at,
+        updated_at=job.updated_at,
+        tasks=[schemas.QuizJobTask.model_validate(task) for task in tasks],
+    )
+
+class QuizJobScheduler:
+    """Runs quiz generation jobs in the background
+
+    Workers call Gemini for one topic at a time, with bounded concurrency and a
+    rate limit, retrying failures with backoff. A single writer stores finished
+    topics in batched transactions. Task state lives in quiz_generation_tasks,
+    so unfinished work resumes after a restart and done topics are never redone.
+    Stopping hands claimed tasks back as pending, and a periodic rescan takes
+    over tasks whose claim lapsed on a worker that went away without stopping.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = QUIZ_JOBS_CONCURRENCY,
+        rate_per_minute: float = QUIZ_JOBS_RATE_PER_MINUTE,
+        max_attempts: int = QUIZ_JOBS_MAX_ATTEMPTS,
+        retry_delay: float = QUIZ_JOBS_RETRY_DELAY_SECONDS,
+        write_batch_size: int = QUIZ_JOBS_WRITE_BATCH_SIZE,
+        write_delay: float = QUIZ_JOBS_WRITE_DELAY_SECONDS,
+        rescan_interval: float = QUIZ_JOBS_RESCAN_SECONDS,
+    ):
+        self.concurrency = concurrency
+        self.rate_per_minute = rate_per_minute
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.write_batch_size = write_batch_size
+        self.write_delay = write_delay
+        self.rescan_interval = rescan_interval
+        self._queue: Optional[asyncio.Queue] = None
+        self._results: Optional[asyncio.Queue] = None
+        self._changed: Optional[asyncio.Condition] = None
+        self._limiter = RateLimiter(rate_per_minute)
+        self._workers: List[asyncio.Task] = []
+        self._writer_task: Optional[asyncio.Task] = None
+        self._rescan_task: Optional[asyncio.Task] = None
+        self._retry_timers: Set[asyncio.Task] = set()
+        # Ids of tasks waiting in the queue, and claim times of tasks claimed here whose outcome is not stored yet
+        self._queued: Set[int] = set()
+        self._claimed: Dict[int, datetime] = {}
+        self._lock = threading.Lock()
+        self.jobs_submitted = 0
+        self.tasks_done = 0
+        self.tasks_failed = 0
+        self.retries = 0
+        self.questions_generated = 0
+        self.write_batches = 0
+        self.released = 0
+
+    async def start(self, resume: bool = True) -> None:
+        """Spawn the workers, the writer and the rescan and, optionally, queue unfinished tasks from earlier runs"""
+        self._queue = asyncio.Queue()
+        self._results = asyncio.Queue()
+        self._changed = asyncio.Condition()
+        self._limiter = RateLimiter(self.rate_per_minute)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+        self._writer_task = asyncio.create_task(self._writer())
+        if resume:
+            await self.resume()
+        # Runs either way, so tasks left pending while credentials were missing start once they are reloaded
+        if self.rescan_interval > 0:
+            self._rescan_task = asyncio.create_task(self._rescan())
+
+    async def stop(self) -> None:
+        background = [*self._workers, *self._retry_timers]
+        if self._rescan_task is not None:
+            background.append(self._rescan_task)
+        for task in background:
+            task.cancel()
+        await asyncio.gather(*background, return_exceptions=True)
+        if self._writer_task is not None:
+            # Let the writer store what has already been generated
+            self._results.put_nowait(None)
+            await asyncio.gather(self._writer_task, return_exceptions=True)
+        await self._release()
+        self._workers = []
+        self._writer_task = None
+        self._rescan_task = None
+        self._retry_timers.clear()
+        self._queued.clear()
+        self._queue = None
+        self._results = None
+        self._changed = None
+
+    async def resume(self) -> int:
+        """Queue pending tasks, and running ones whose claim has lapsed"""
+        async with models.AsyncSessionLocal() as db:
+            rows = (await db.execute(
+                select(Task.id, Task.job_id, Task.topic_id, Task.num_questions, Job.use_cache)
+                .join(Job, Job.id == Task.job_id)
+                .where(_claimable())
+                .order_by(Task.id)
+            )).all()
+        queued = 0
+        for row in rows:
+            queued += self._enqueue(_Work(*row))
+        return queued
+
+    async def _rescan(self) -> None:
+        while True:
+            await asyncio.sleep(self.rescan_interval)
+            if not llm.registry.is_configured():
+                continue
+            try:
+                await self.resume()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Rescanning quiz job tasks failed")
+
+    async def _release(self) -> None:
+        """Hand tasks claimed here but not finished back as pending, so another worker takes them at once"""
+        if not self._claimed:
+            return
+        try:
+            async with models.AsyncSessionLocal() as db:
+                released = (await db.execute(
+                    update(Task)
+                    .where(Task.id.in_(list(self._claimed)), Task.status == "running")
+                    .values(status="pending", claimed_at=None)
+                    .execution_options(synchronize_session=False)
+                )).rowcount
+                await db.commit()
+        except Exception:
+            # Their lease lapses instead and the next rescan anywhere takes them over
+            logger.exception("Releasing %d quiz job tasks failed", len(self._claimed))
+            return
+        finally:
+            self._claimed.clear()
+        with self._lock:
+            self.released += released
+
+    def _enqueue(self, work: _Work, attempt: int = 1) -> bool:
+        # Without a running scheduler the task stays pending until one resumes it.
+        # A rescan can find a task that is already queued here; it is not queued twice
+        if self._queue is None or (attempt == 1 and work.task_id in self._queued):
+            return False
+        self._queued.add(work.task_id)
+        self._queue.put_nowait((work, attempt))
+        return True
+
+    async def submit(self, db: AsyncSession, user_id: int, request: schemas.QuizJobCreate) -> schemas.QuizJob:
+        if not 1 <= len(request.items) <= QUIZ_JOBS_MAX_TOPICS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"A job takes between 1 and {QUIZ_JOBS_MAX_TOPICS} topics"
+            )
+        for item in request.items:
+            if not 1 <= item.num_questions <= QUIZ_JOBS_MAX_QUESTIONS:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"num_questions must be between 1 and {QUIZ_JOBS_MAX_QUESTIONS}"
+                )
+            await topic_catalog.require(db, item.topic_id)
+
+        job = models.QuizGenerationJob(user_id=user_id, use_cache=request.use_cache)
+        job.tasks = [
+            models.QuizGenerationTask(topic_id=item.topic_id, num_questions=item.num_questions)
+            for item in request.items
+        ]
+        db.add(job)
+        await db.commit()
+        for task in job.tasks:
+            self._enqueue(_Work(task.id, job.id, task.topic_id, task.num_questions, job.use_cache))
+        with self._lock:
+            self.jobs_submitted += 1
+        return _summarize(job, job.tasks)
+
+    async def _owned_job(self, db: AsyncSession, job_id: int, user_id: int) -> models.QuizGenerationJob:
+        job = await db.get(models.QuizGenerationJob, job_id)
+        if job is None or job.user_id != user_id:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Quiz job not found"
+            )
+        return job
+
+    async def get(self, db: AsyncSession, job_id: int, user_id: int) -> schemas.QuizJob:
+        """The job with per-task progress, or a 404 when it is not the user's"""
+        job = await self._owned_job(db, job_id, user_id)
+        tasks = (await db.scalars(select(Task).where(Task.job_id == job_id).order_by(Task.id))).all()
+        return _summarize(job, tasks)
+
+    async def retry(self, db: AsyncSession, job_id: int, user_id: int) -> schemas.QuizJob:
+        """Queue a job's failed tasks, and running ones whose claim has lapsed, again;
+        done tasks keep their questions
+        """
+        job = await self._owned_job(db, job_id, user_id)
+        lapsed = datetime.utcnow() - timedelta(seconds=QUIZ_JOBS_LEASE_SECONDS)
+        stuck = (await db.scalars(
+            select(Task)
+            .where(
+                Task.job_id == job_id,
+                or_(Task.status == "failed", and_(Task.status == "running", Task.claimed_at < lapsed)),
+            )
+        )).all()
+        for task in stuck:
+            task.status = "pending"
+            task.claimed_at = None
+            task.error = None
+        job.updated_at = datetime.utcnow()
+        await db.commit()
+        for task in stuck:
+            self._enqueue(_Work(task.id, job.id, task.topic_id, task.num_questions, job.use_cache))
+        return await self.get(db, job_id, user_id)
+
+    async def wait_for_change(self, timeout: float = QUIZ_JOBS_POLL_SECONDS) -> None:
+        """Return once this worker has written job results, or after `timeout`"""
+        if self._changed is None:
+            await asyncio.sleep(timeout)
+            return
+        async with self._changed:
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _claim(self, work: _Work, attempt: int) -> bool:
+        """Claim the task for this attempt, renewing its lease; False when another worker has it
+
+        Another worker process may have resumed the same task. A retry renews the
+        claim it already holds, and only while that claim is unchanged, so a lease
+        that lapsed while the retry waited is not run twice.
+        """
+        if attempt == 1:
+            condition = _claimable()
+        else:
+            previous = self._claimed.get(work.task_id)
+            if previous is None:
+                return False
+            condition = and_(Task.status == "running", Task.claimed_at == previous)
+        claimed_at = datetime.utcnow()
+        async with models.AsyncSessionLocal() as db:
+            claimed = (await db.execute(
+                update(Task)
+                .where(Task.id == work.task_id, condition)
+                .values(status="running", claimed_at=claimed_at)
+                .execution_options(synchronize_session=False)
+            )).rowcount
+            await db.commit()
+        if claimed == 1:
+            self._claimed[work.task_id] = claimed_at
+        elif attempt > 1:
+            self._claimed.pop(work.task_id, None)
+        return claimed == 1
+
+    async def _worker(self) -> None:
+        while True:
+            work, attempt = await self._queue.get()
+            self._queued.discard(work.task_id)
+            try:
+                if await self._claim(work, attempt):
+                    await self._run(work, attempt)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Quiz job task %s failed unexpectedly", work.task_id)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, work: _Work, attempt: int) -> None:
+        await self._limiter.acquire()
+        try:
+            async with models.AsyncSessionLocal() as db:
+                topic = await topic_catalog.require(db, work.topic_id)
+            questions = await generate_questions(topic, work.num_questions, work.use_cache)
+            if not questions:
+                raise ValueError("Gemini returned no usable questions")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if attempt < self.max_attempts:
+                self._retry_later(work, attempt)
+                return
+            error = getattr(e, "detail", None) or str(e) or type(e).__name__
+            await self._results.put(_Outcome(work, attempt, [], str(error)))
+            return
+        await self._results.put(_Outcome(work, attempt, questions, None))
+
+    def _retry_later(self, work: _Work, attempt: int) -> None:
+        delay = self.retry_delay * 2 ** (attempt - 1)
+
+        async def requeue():
+            await asyncio.sleep(delay)
+            self._enqueue(work, attempt + 1)
+
+        timer = asyncio.create_task(requeue())
+        self._retry_timers.add(timer)
+        timer.add_done_callback(self._retry_timers.discard)
+        with self._lock:
+            self.retries += 1
+
+    async def _writer(self) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            outcome = await self._results.get()
+            if outcome is None:
+                return
+            batch = [outcome]
+            deadline = loop.time() + self.write_delay
+            while len(batch) < self.write_batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    outcome = await asyncio.wait_for(self._results.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+                if outcome is None:
+                    stopping = True
+                    break
+                batch.append(outcome)
+            try:
+                await self._write(batch)
+            except Exception:
+                # The tasks stay running; stop() hands them back, or a rescan takes them once their lease lapses
+                logger.exception("Storing %d quiz job results failed", len(batch))
+
+    async def _write(self, batch: List[_Outcome]) -> None:
+        stored = []
+        async with models.AsyncSessionLocal() as db:
+            for outcome in batch:
+                work = outcome.work
+                values = {"attempts": Task.attempts + outcome.attempts}
+                if outcome.error is None:
+                    values.update(status="done", generated=len(outcome.questions), error=None)
+                else:
+                    values.update(status="failed", error=outcome.error[:500])
+                # Skip a task that was meanwhile finished elsewhere, so its questions are not stored twice
+                updated = (await db.execute(
+                    update(Task)
+                    .where(Task.id == work.task_id, Task.status == "running")
+                    .values(**values)
+                    .execution_options(synchronize_session=False)
+                )).rowcount
+                if updated and outcome.questions:
+                    quizzes = [models.Quiz(topic_id=work.topic_id, **q_data) for q_data in outcome.questions]
+                    db.add_all(quizzes)
+                    stored.append((work.topic_id, quizzes))
+            await db.execute(
+                update(Job)
+                .where(Job.id.in_({outcome.work.job_id for outcome in batch}))
+                .values(updated_at=datetime.utcnow())
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+        for outcome in batch:
+            self._claimed.pop(outcome.work.task_id, None)
+        for topic_id, quizzes in stored:
+            answer_keys.add(topic_id, quizzes)
+
+        with self._lock:
+            self.write_batches += 1
+            for outcome in batch:
+                if outcome.error is None:
+                    self.tasks_done += 1
+                    self.questions_generated += len(outcome.questions)
+                else:
+                    self.tasks_failed += 1
+        async with self._changed:
+            self._changed.notify_all()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "concurrency": self.concurrency,
+                "rate_per_minute": self.rate_per_minute,
+                "queued": self._queue.qsize() if self._queue is not None else 0,
+                "waiting_to_retry": len(self._retry_timers),
+                "claimed": len(self._claimed),
+                "released": self.released,
+                "jobs_submitted": self.jobs_submitted,
+                "tasks_done": self.tasks_done,
+                "tasks_failed": self.tasks_failed,
+                "retries": self.retries,
+                "questions_generated": self.questions_generated,
+                "write_batches": self.write_batches,
+            }
+
+quiz_jobs = QuizJobScheduler()
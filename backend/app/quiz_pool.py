@@ -0,0 +1,183 @@
+import asyncio
+import logging
+import os
+import threading
+from typing import Dict, List, Optional, Set
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import models, schemas
+from .answer_keys import answer_keys
+from .quiz_generation import generate_questions
+from .topic_catalog import topic_catalog
+
+logger = logging.getLogger(__name__)
+
+QUIZ_POOL_ENABLED = os.getenv("QUIZ_POOL_ENABLED", "true").lower() == "true"
+# Questions kept ready per topic
+QUIZ_POOL_TARGET_DEPTH = int(os.getenv("QUIZ_POOL_TARGET_DEPTH", "10"))
+# Questions requested from Gemini per refill call
+QUIZ_POOL_BATCH_SIZE = int(os.getenv("QUIZ_POOL_BATCH_SIZE", "5"))
+QUIZ_POOL_REFILL_CONCURRENCY = int(os.getenv("QUIZ_POOL_REFILL_CONCURRENCY", "2"))
+
+class QuizPool:
+    """Per-topic pool of pre-generated quiz questions, refilled by background workers"""
+
+    def __init__(
+        self,
+        target_depth: int = QUIZ_POOL_TARGET_DEPTH,
+        batch_size: int = QUIZ_POOL_BATCH_SIZE,
+        concurrency: int = QUIZ_POOL_REFILL_CONCURRENCY,
+    ):
+        self.target_depth = target_depth
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self._queue: Optional[asyncio.Queue] = None
+        self._pending: Set[int] = set()
+        self._topic_locks: Dict[int, asyncio.Lock] = {}
+        self._workers: List[asyncio.Task] = []
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.refills = 0
+        self.refill_failures = 0
+        self.questions_generated = 0
+
+    async def start(self, warm: bool = True) -> None:
+        """Spawn the refill workers and, optionally, queue every topic for an initial fill"""
+        self._queue = asyncio.Queue()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+        if warm:
+            async with models.AsyncSessionLocal() as db:
+                for topic in await topic_catalog.list(db):
+                    self.request_refill(topic.id)
+
+    async def stop(self) -> None:
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._queue = None
+        self._pending.clear()
+        self._topic_locks.clear()
+
+    def request_refill(self, topic_id: int) -> None:
+        """Queue a topic for top-up unless it is already waiting"""
+        if self._queue is None or topic_id in self._pending:
+            return
+        self._pending.add(topic_id)
+        self._queue.put_nowait(topic_id)
+
+    async def depth(self, db: AsyncSession, topic_id: int) -> int:
+        return await db.scalar(
+            select(func.count(models.QuizPoolItem.id))
+            .where(models.QuizPoolItem.topic_id == topic_id)
+        )
+
+    async def take(self, topic_id: int, count: int) -> Optional[List[schemas.Quiz]]:
+        """Move `count` pooled questions into the quizzes table, or return None if the pool is short"""
+        # Own session, so a lost race can roll back without expiring the caller's objects
+        async with models.AsyncSessionLocal() as db:
+            items = (await db.scalars(
+                select(models.QuizPoolItem)
+                .where(models.QuizPoolItem.topic_id == topic_id)
+                .order_by(models.QuizPoolItem.id)
+                .limit(count)
+            )).all()
+            if len(items) < count:
+                with self._lock:
+                    self.misses += 1
+                return None
+
+            # A concurrent request may have claimed the same rows first
+            claimed = (await db.execute(
+                delete(models.QuizPoolItem)
+                .where(models.QuizPoolItem.id.in_([item.id for item in items]))
+                .execution_options(synchronize_session=False)
+            )).rowcount
+            if claimed != len(items):
+                await db.rollback()
+                with self._lock:
+                    self.misses += 1
+                return None
+
+            quizzes = [
+                models.Quiz(
+                    topic_id=topic_id,
+                    question=item.question,
+                    options=item.options,
+                    correct_option=item.correct_option
+                )
+                for item in items
+            ]
+            db.add_all(quizzes)
+            await db.commit()
+            answer_keys.add(topic_id, quizzes)
+
+        with self._lock:
+            self.hits += 1
+        return [schemas.Quiz.model_validate(quiz) for quiz in quizzes]
+
+    async def _worker(self) -> None:
+        while True:
+            topic_id = await self._queue.get()
+            # Requests arriving while this refill runs queue another pass
+            self._pending.discard(topic_id)
+            try:
+                await self._refill(topic_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                with self._lock:
+                    self.refill_failures += 1
+                logger.exception("Refilling quiz pool for topic %s failed", topic_id)
+            finally:
+                self._queue.task_done()
+
+    async def _refill(self, topic_id: int) -> None:
+        # One refill per topic at a time, so two workers never overshoot the target
+        lock = self._topic_locks.setdefault(topic_id, asyncio.Lock())
+        async with lock:
+            await self._refill_topic(topic_id)
+
+    async def _refill_topic(self, topic_id: int) -> None:
+        async with models.AsyncSessionLocal() as db:
+            topic = await topic_catalog.get(db, topic_id)
+            if not topic:
+                return
+
+            missing = self.target_depth - await self.depth(db, topic_id)
+            while missing > 0:
+                # Pooled questions must be fresh generations, never cached repeats
+                questions = await generate_questions(topic, min(self.batch_size, missing), use_cache=False)
+                if not questions:
+                    raise ValueError("Gemini returned no usable questions")
+                db.add_all(models.QuizPoolItem(topic_id=topic_id, **q_data) for q_data in questions)
+                await db.commit()
+                missing -= len(questions)
+                with self._lock:
+                    self.questions_generated += len(questions)
+
+            with self._lock:
+                self.refills += 1
+
+    async def stats(self, db: AsyncSession) -> dict:
+        depths = dict((await db.execute(
+            select(models.QuizPoolItem.topic_id, func.count(models.QuizPoolItem.id))
+            .group_by(models.QuizPoolItem.topic_id)
+        )).all())
+        with self._lock:
+            takes = self.hits + self.misses
+            return {
+                "target_depth": self.target_depth,
+                "refill_concurrency": self.concurrency,
+                "depth_by_topic": depths,
+                "pending_refills": len(self._pending),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / takes if takes else 0.0,
+                "refills": self.refills,
+                "refill_failures": self.refill_failures,
+                "questions_generated": self.questions_generated,
+            }
+
+quiz_pool = QuizPool()
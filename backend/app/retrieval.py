@@ -0,0 +1,247 @@
+import asyncio
+import os
+import re
+import threading
+import time
+import zlib
+from typing import Callable, List, Optional, Sequence, Set, Tuple
+import numpy as np
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import models
+
+RAG_ENABLED = os.getenv("RAG_ENABLED", "true").lower() == "true"
+# "hashing" is local and deterministic; "gemini" calls the embedding API
+RAG_EMBEDDER = os.getenv("RAG_EMBEDDER", "hashing")
+RAG_EMBEDDING_DIM = int(os.getenv("RAG_EMBEDDING_DIM", "256"))
+RAG_GEMINI_EMBEDDING_MODEL = os.getenv("RAG_GEMINI_EMBEDDING_MODEL", "models/embedding-001")
+RAG_CHUNK_CHARS = int(os.getenv("RAG_CHUNK_CHARS", "800"))
+RAG_TOP_K = int(os.getenv("RAG_TOP_K", "3"))
+# Chunks scoring below this cosine similarity are not worth putting in the prompt
+RAG_MIN_SCORE = float(os.getenv("RAG_MIN_SCORE", "0.15"))
+# How often searches pick up Content rows written by other worker processes
+RAG_SYNC_INTERVAL_SECONDS = float(os.getenv("RAG_SYNC_INTERVAL_SECONDS", "30"))
+
+Embedder = Callable[[str], Sequence[float]]
+
+_token_re = re.compile(r"\w+")
+# Words too common, or too much part of how questions are phrased, to say what a passage covers
+_stopwords = frozenset(
+    "a about an and are as at be by can define describe do does explain for from how i in is it its "
+    "me of on or tell that the their then this to using was what when where which why with you your".split()
+)
+_sentence_re = re.compile(r"(?<=[.!?])\s+")
+
+class HashingEmbedder:
+    """Feature-hashed bag of words and bigrams; deterministic across processes and needs no network"""
+
+    def __init__(self, dim: int = RAG_EMBEDDING_DIM):
+        self.dim = dim
+
+    def __call__(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        # Crude plural folding, so "gradients" matches "gradient"
+        tokens = [
+            t[:-1] if len(t) > 3 and t.endswith("s") and not t.endswith("ss") else t
+            for t in _token_re.findall(text.lower())
+            if t not in _stopwords
+        ]
+        for feature in tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]:
+            h = zlib.crc32(feature.encode())
+            # The top bit picks the sign so collisions tend to cancel out
+            vector[h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+class GeminiEmbedder:
+    """Gemini embedding API; blocking, so the index calls it from the threadpool"""
+
+    def __init__(self, model_name: str = RAG_GEMINI_EMBEDDING_MODEL):
+        import google.generativeai as genai
+        self._genai = genai
+        self.model_name = model_name
+
+    def __call__(self, text: str) -> np.ndarray:
+        result = self._genai.embed_content(model=self.model_name, content=text)
+        vector = np.asarray(result["embedding"], dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+def build_embedder(name: str = RAG_EMBEDDER) -> Embedder:
+    if name == "hashing":
+        return HashingEmbedder()
+    if name == "gemini":
+        return GeminiEmbedder()
+    raise ValueError(f"Unknown embedder: {name}")
+
+def chunk_text(text: str, max_chars: int = RAG_CHUNK_CHARS) -> List[str]:
+    """Split text into chunks of whole paragraphs or sentences, each about max_chars long"""
+    pieces = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = " ".join(paragraph.split())
+        if not paragraph:
+            continue
+        pieces.extend([paragraph] if len(paragraph) <= max_chars else _sentence_re.split(paragraph))
+
+    chunks, current = [], ""
+    for piece in pieces:
+        if current and len(current) + len(piece) + 1 > max_chars:
+            chunks.append(current)
+            current = ""
+        current = f"{current} {piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+def format_context(context: Sequence[dict]) -> str:
+    """Retrieved chunks as a prompt section, or nothing when there are none"""
+    if not context:
+        return ""
+    passages = "\n\n".join(f"[{i}] {chunk['text']}" for i, chunk in enumerate(context, 1))
+    return f"Use this course material where it is relevant:\n{passages}\n\n"
+
+class VectorIndex:
+    """In-memory matrix of unit-length chunk vectors, searched with one matrix-vector product
+
+    Vectors are stored one dimension per row, so a sparse query (as the hashing
+    embedder produces) only reads the rows for its non-zero dimensions.
+    """
+
+    def __init__(self, embedder: Optional[Embedder] = None, sync_interval: float = RAG_SYNC_INTERVAL_SECONDS):
+        self.embedder = embedder
+        self.sync_interval = sync_interval
+        self._vectors: Optional[np.ndarray] = None
+        self._topic_ids = np.zeros(0, dtype=np.int64)
+        self._content_ids = np.zeros(0, dtype=np.int64)
+        self._texts: List[str] = []
+        self._size = 0
+        self._content_ids_indexed: Set[int] = set()
+        # Highest Content id seen by sync(); rows above it are still to be checked
+        self._synced_until_id = 0
+        self._last_sync = 0.0
+        self._lock = threading.Lock()
+        self._sync_lock = asyncio.Lock()
+        self.searches = 0
+        self.total_search_seconds = 0.0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _grow(self, dim: int, needed: int) -> None:
+        # Capacity doubles so appends stay amortised O(1) per chunk
+        capacity = 0 if self._vectors is None else self._vectors.shape[1]
+        if needed <= capacity:
+            return
+        capacity = max(needed, capacity * 2, 1024)
+        vectors = np.zeros((dim, capacity), dtype=np.float32)
+        topic_ids = np.zeros(capacity, dtype=np.int64)
+        content_ids = np.zeros(capacity, dtype=np.int64)
+        if self._vectors is not None:
+            vectors[:, :self._size] = self._vectors[:, :self._size]
+            topic_ids[:self._size] = self._topic_ids[:self._size]
+            content_ids[:self._size] = self._content_ids[:self._size]
+        self._vectors, self._topic_ids, self._content_ids = vectors, topic_ids, content_ids
+
+    def add_vectors(self, vectors: np.ndarray, texts: Sequence[str], topic_id: int, content_id: int) -> None:
+        with self._lock:
+            if content_id in self._content_ids_indexed:
+                return
+            self._content_ids_indexed.add(content_id)
+            if not len(texts):
+                return
+            start = self._size
+            self._grow(vectors.shape[1], start + len(texts))
+            self._vectors[:, start:start + len(texts)] = vectors.T
+            self._topic_ids[start:start + len(texts)] = topic_id
+            self._content_ids[start:start + len(texts)] = content_id
+            self._texts.extend(texts)
+            self._size += len(texts)
+
+    def _embed_content(self, content: models.Content) -> Tuple[List[str], Optional[np.ndarray]]:
+        chunks = chunk_text(content.summary_text)
+        return chunks, np.stack([self.embedder(chunk) for chunk in chunks]) if chunks else None
+
+    async def add_content(self, content: models.Content) -> None:
+        """Index a newly committed Content row"""
+        if self.embedder is None or content.id in self._content_ids_indexed:
+            return
+        chunks, vectors = await run_in_threadpool(self._embed_content, content)
+        self.add_vectors(vectors, chunks, content.topic_id, content.id)
+
+    async def sync(self, db: AsyncSession) -> int:
+        """Index Content rows added since the last sync, e.g. by another worker process"""
+        async with self._sync_lock:
+            rows = (await db.scalars(
+                select(models.Content)
+                .where(models.Content.id > self._synced_until_id)
+                .order_by(models.Content.id)
+            )).all()
+            for content in rows:
+                await self.add_content(content)
+                self._synced_until_id = content.id
+            self._last_sync = time.monotonic()
+            return len(rows)
+
+    async def search(
+        self,
+        db: AsyncSession,
+        query: str,
+        k: int = RAG_TOP_K,
+        topic_id: Optional[int] = None,
+        min_score: float = RAG_MIN_SCORE
+    ) -> List[dict]:
+        if self.embedder is None:
+            return []
+        if time.monotonic() - self._last_sync > self.sync_interval:
+            await self.sync(db)
+        query_vector = await run_in_threadpool(self.embedder, query)
+        return self.search_vector(query_vector, k, topic_id, min_score)
+
+    def search_vector(
+        self,
+        query_vector: np.ndarray,
+        k: int = RAG_TOP_K,
+        topic_id: Optional[int] = None,
+        min_score: float = RAG_MIN_SCORE
+    ) -> List[dict]:
+        started = time.perf_counter()
+        with self._lock:
+            if not self._size:
+                return []
+            # Vectors are unit length, so the dot product is the cosine similarity
+            dims = np.flatnonzero(query_vector)
+            if len(dims) < len(query_vector) // 2:
+                scores = query_vector[dims] @ self._vectors[dims, :self._size]
+            else:
+                scores = query_vector @ self._vectors[:, :self._size]
+            if topic_id is not None:
+                scores = np.where(self._topic_ids[:self._size] == topic_id, scores, -np.inf)
+            k = min(k, self._size)
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            results = [
+                {
+                    "text": self._texts[i],
+                    "score": float(scores[i]),
+                    "topic_id": int(self._topic_ids[i]),
+                    "content_id": int(self._content_ids[i]),
+                }
+                for i in top
+                if scores[i] >= min_score
+            ]
+            self.searches += 1
+            self.total_search_seconds += time.perf_counter() - started
+        return results
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "chunks": self._size,
+                "contents": len(self._content_ids_indexed),
+                "bytes": 0 if self._vectors is None else int(self._vectors[:, :self._size].nbytes),
+                "searches": self.searches,
+                "avg_search_ms": self.total_search_seconds / self.searches * 1000 if self.searches else 0.0,
+            }
+
+retrieval_index = VectorIndex(build_embedder() if RAG_ENABLED else None)
@@ -1,14 +1,23 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import timedelta
 from .. import models, schemas, auth
+from ..passwords import PasswordHasherBusy, password_hasher
 
 router = APIRouter(prefix="/auth", tags=["authentication"])
 
+def _hasher_busy():
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many sign-ins in progress, please retry shortly",
+        headers={"Retry-After": "1"},
+    )
+
 @router.post("/register", response_model=schemas.UserResponse)
-def register_user(user: schemas.UserCreate, db: Session = Depends(models.get_db)):
+async def register_user(user: schemas.UserCreate, db: AsyncSession = Depends(models.get_async_db)):
     # Check if user already exists
-    db_user = db.query(models.User).filter(models.User.email == user.email).first()
+    db_user = await db.scalar(select(models.User).where(models.User.email == user.email))
     if db_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -16,37 +25,60 @@ def register_user(user: schemas.UserCreate, db: Session = Depends(models.get_db)
         )
     
     # Create new user
-    hashed_password = auth.get_password_hash(user.password)
+    # bcrypt is CPU bound, it runs on its own pool
+    try:
+        hashed_password = await password_hasher.hash(user.password)
+    except PasswordHasherBusy:
+        raise _hasher_busy()
     db_user = models.User(
         name=user.name,
         email=user.email,
         hashed_password=hashed_password
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     
     return db_user
 
 @router.post("/login", response_model=schemas.Token)
-def login_user(user: schemas.UserLogin, db: Session = Depends(models.get_db)):
+async def login_user(user: schemas.UserLogin, db: AsyncSession = Depends(models.get_async_db)):
     # Verify user credentials
-    db_user = db.query(models.User).filter(models.User.email == user.email).first()
-    if not db_user or not auth.verify_password(user.password, db_user.hashed_password):
+    db_user = await db.scalar(select(models.User).where(models.User.email == user.email))
+    valid, new_hash = False, None
+    if db_user:
+        try:
+            valid, new_hash = await password_hasher.verify_and_update(user.password, db_user.hashed_password)
+        except PasswordHasherBusy:
+            raise _hasher_busy()
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
+    # Stored hash predates the current BCRYPT_ROUNDS, replace it now that we know the password
+    if new_hash is not None:
+        db_user.hashed_password = new_hash
+        await db.commit()
+
     # Create access token
     access_token_expires = timedelta(minutes=auth.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = auth.create_access_token(
-        data={"sub": db_user.email}, expires_delta=access_token_expires
+        data={"sub": db_user.email, "uid": db_user.id}, expires_delta=access_token_expires
     )
     
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.get("/me", response_model=schemas.UserResponse)
-def get_current_user_info(current_user: models.User = Depends(auth.get_current_user)):
+async def get_current_user_info(current_user: models.User = Depends(auth.get_current_user)):
     return current_user
+
+@router.get("/password-hasher/stats")
+async def get_password_hasher_stats(current_user: models.User = Depends(auth.get_current_user)):
+    return password_hasher.stats()
+
+@router.get("/identity-cache/stats")
+async def get_identity_cache_stats(current_user: models.User = Depends(auth.get_current_user)):
+    return auth.identity_cache.stats()
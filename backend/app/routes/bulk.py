@@ -0,0 +1,43 @@
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from .. import models, schemas, auth
+from ..bulk import RECORD_TYPES, export_ndjson, import_ndjson, iter_lines
+from ..topic_catalog import topic_catalog
+
+router = APIRouter(prefix="/bulk", tags=["bulk"])
+
+@router.post("/import", response_model=schemas.BulkImportReport)
+async def bulk_import(
+    request: Request,
+    db: AsyncSession = Depends(models.get_async_db),
+    admin_user: models.User = Depends(auth.get_admin_user)
+):
+    """Import an NDJSON request body of topics, content and quizzes, read as it arrives"""
+    report = await import_ndjson(db, iter_lines(request.stream()))
+    # Other workers notice through the bumped table versions
+    topic_catalog.invalidate()
+    return report
+
+@router.get("/export")
+async def bulk_export(
+    types: str = Query(",".join(RECORD_TYPES), description="Comma-separated record types"),
+    topic_id: Optional[int] = None,
+    admin_user: models.User = Depends(auth.get_admin_user)
+):
+    kinds = [kind.strip() for kind in types.split(",") if kind.strip()]
+    unknown = sorted(set(kinds) - set(RECORD_TYPES))
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown record types {unknown}; choose from {list(RECORD_TYPES)}"
+        )
+
+    async def stream():
+        # The response outlives the request's dependencies, so the export opens its own session
+        async with models.AsyncSessionLocal() as db:
+            async for chunk in export_ndjson(db, kinds, topic_id):
+                yield chunk
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
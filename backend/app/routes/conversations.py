@@ -0,0 +1,103 @@
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request, status
+from sqlalchemy import and_, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from .. import models, schemas, auth, conversations
+
+router = APIRouter(prefix="/conversations", tags=["conversations"])
+
+@router.post("/", response_model=schemas.Conversation)
+async def create_conversation(
+    conversation: schemas.ConversationCreate,
+    db: AsyncSession = Depends(models.get_async_db),
+    current_user_id: int = Depends(auth.get_current_user_id)
+):
+    db_conversation = models.Conversation(user_id=current_user_id, **conversation.dict())
+    db.add(db_conversation)
+    await db.commit()
+    await db.refresh(db_conversation)
+    return db_conversation
+
+@router.get("/", response_model=List[schemas.Conversation])
+async def get_conversations(
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    db: AsyncSession = Depends(models.get_async_db),
+    current_user_id: int = Depends(auth.get_current_user_id)
+):
+    return (await db.scalars(
+        select(models.Conversation)
+        .where(models.Conversation.user_id == current_user_id)
+        .order_by(models.Conversation.updated_at.desc())
+        .offset(offset)
+        .limit(limit)
+    )).all()
+
+@router.get("/{conversation_id}/messages", response_model=schemas.ConversationMessagePage)
+async def get_conversation_messages(
+    conversation_id: int,
+    before: Optional[int] = None,
+    limit: int = Query(50, ge=1, le=200),
+    db: AsyncSession = Depends(models.get_async_db),
+    current_user_id: int = Depends(auth.get_current_user_id)
+):
+    """A page of history, oldest first, ending just before the message id `before`"""
+    await conversations.get_user_conversation(db, conversation_id, current_user_id)
+
+    query = select(models.ConversationMessage).where(models.ConversationMessage.conversation_id == conversation_id)
+    if before is not None:
+        cursor = await db.get(models.ConversationMessage, before)
+        if cursor is None or cursor.conversation_id != conversation_id:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid cursor"
+            )
+        # Keyset on (created_at, id), served by ix_conversation_messages_conversation_created
+        query = query.where(or_(
+            models.ConversationMessage.created_at < cursor.created_at,
+            and_(
+                models.ConversationMessage.created_at == cursor.created_at,
+                models.ConversationMessage.id < cursor.id
+            )
+        ))
+
+    # One extra row tells whether an older page exists
+    rows = (await db.scalars(
+        query
+        .order_by(models.ConversationMessage.created_at.desc(), models.ConversationMessage.id.desc())
+        .limit(limit + 1)
+    )).all()
+    page = rows[:limit][::-1]
+    return schemas.ConversationMessagePage(
+        messages=[schemas.ConversationMessage.model_validate(m) for m in page],
+        next_before=page[0].id if len(rows) > limit else None
+    )
+
+@router.post("/{conversation_id}/messages", response_model=schemas.ConversationTurn)
+async def add_conversation_message(
+    request: Request,
+    conversation_id: int,
+    message: schemas.ConversationMessageCreate,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(models.get_async_db),
+    current_user_id: int = Depends(auth.get_current_user_id)
+):
+    """Append a student turn and the tutor's reply, answering with the conversation so far as context"""
+    conversation = await conversations.get_user_conversation(db, conversation_id, current_user_id)
+
+    try:
+        user_message, assistant_message, _ = await conversations.reply(request, db, conversation, message.prompt)
+        background_tasks.add_task(conversations.summarize_overflow, conversation_id)
+
+        return schemas.ConversationTurn(
+            user_message=schemas.ConversationMessage.model_validate(user_message),
+            assistant_message=schemas.ConversationMessage.model_validate(assistant_message)
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error generating response: {str(e)}"
+        )
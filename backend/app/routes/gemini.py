@@ -1,197 +1,306 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-import google.generativeai as genai
-import os
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime, timedelta
+import asyncio
 import json
-import re
-from typing import List
-from .. import models, schemas, auth
-from dotenv import load_dotenv
+import logging
+import os
+from typing import List, Optional
+from .. import models, schemas, auth, llm, conversations
+from ..answer_keys import answer_keys
+from ..cache import normalize_prompt, response_cache
+from ..deflection import deflector
+from ..quiz_generation import generate_questions, parse_stats
+from ..quiz_jobs import quiz_jobs
+from ..quiz_pool import quiz_pool
+from ..retrieval import format_context, retrieval_index
+from ..singleflight import SingleFlight
+from ..topic_catalog import topic_catalog
 
-# Load environment variables
-load_dotenv()
+logger = logging.getLogger(__name__)
+
+# Stored explanations younger than this are served without calling Gemini
+EXPLANATION_MAX_AGE_SECONDS = int(os.getenv("EXPLANATION_MAX_AGE_SECONDS", str(7 * 24 * 3600)))
 
 router = APIRouter(prefix="/gemini", tags=["gemini"])
 
-def get_gemini_model():
-    """Configure and return Gemini model with proper error handling"""
-    # Load environment variables from the correct path
-    import os
-    from dotenv import load_dotenv
-    
-    # Get the correct path to .env file
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    backend_dir = os.path.dirname(os.path.dirname(current_dir))
-    env_path = os.path.join(backend_dir, '.env')
-    
-    # Load environment variables
-    load_dotenv(env_path)
-    
-    api_key = os.getenv("GEMINI_API_KEY")
-    if not api_key:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="GEMINI_API_KEY not found in environment variables"
-        )
-    
-    try:
-        genai.configure(api_key=api_key)
-        return genai.GenerativeModel('gemini-1.5-flash-8b')
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Error configuring Gemini API: {str(e)}"
-        )
+# Identical concurrent requests share one upstream call
+flights = SingleFlight()
 
-@router.post("/query", response_model=schemas.GeminiResponse)
-def query_gemini(
-    query: schemas.GeminiQuery,
-    db: Session = Depends(models.get_db),
-    current_user: models.User = Depends(auth.get_current_user)
-):
-    try:
-        # Get configured Gemini model
-        model = get_gemini_model()
-        
-        # Simple prompt for better AI/ML explanations
-        enhanced_prompt = f"""
+def build_query_prompt(prompt: str, context: List[dict] = ()) -> str:
+    """Wrap a student's question in the tutor prompt"""
+    # Simple prompt for better AI/ML explanations
+    return f"""
         You are an AI tutor. Explain this clearly for students:
         
-        {query.prompt}
+        {format_context(context)}{prompt}
         
         Provide:
         - Clear explanation
         - Practical examples
         - Key concepts
         """
+
+def query_cache_key(query: schemas.GeminiQuery) -> str:
+    """The student's question, scoped to the topic whose material is retrieved for it"""
+    return query.prompt if query.topic_id is None else f"topic {query.topic_id} {query.prompt}"
+
+def format_sse(data: dict, event: Optional[str] = None) -> str:
+    """Encode a payload as a Server-Sent Events message"""
+    message = f"data: {json.dumps(data)}\n\n"
+    if event:
+        message = f"event: {event}\n{message}"
+    return message
+
+@router.post("/query", response_model=schemas.GeminiResponse)
+async def query_gemini(
+    request: Request,
+    query: schemas.GeminiQuery,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(models.get_async_db),
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    try:
+        if query.conversation_id is not None:
+            conversation = await conversations.get_user_conversation(db, query.conversation_id, current_user.id)
+            _, assistant_message, deflection = await conversations.reply(
+                request, db, conversation, query.prompt, query.topic_id
+            )
+            background_tasks.add_task(conversations.summarize_overflow, conversation.id)
+            return schemas.GeminiResponse(
+                response=assistant_message.content,
+                topic_id=query.topic_id,
+                source=deflection.source if deflection else None,
+                confidence=deflection.confidence if deflection else None
+            )
+        
+        # Questions that closely match something already answered skip Gemini entirely
+        if query.use_cache:
+            deflection = await deflector.deflect(db, query.prompt, query.topic_id)
+            if deflection is not None:
+                return schemas.GeminiResponse(
+                    response=deflection.answer,
+                    topic_id=query.topic_id,
+                    source=deflection.source,
+                    confidence=deflection.confidence
+                )
         
-        response = model.generate_content(enhanced_prompt)
+        context = await retrieval_index.search(db, query.prompt, topic_id=query.topic_id)
+        enhanced_prompt = build_query_prompt(query.prompt, context)
+        
+        # The cache keys on the student's question, not the template around it.
+        # A request bypassing the cache never joins one that may be served from it
+        cache_key = query_cache_key(query)
+        response_text = await llm.cancel_on_disconnect(request, flights.do(
+            ("query", normalize_prompt(cache_key), query.use_cache),
+            lambda: llm.generate_text(enhanced_prompt, "query", query.use_cache, cache_key=cache_key)
+        ))
+        await deflector.record_answer(query.prompt, query.topic_id, response_text)
         
         return schemas.GeminiResponse(
-            response=response.text,
-            prompt=query.prompt
+            response=response_text,
+            topic_id=query.topic_id
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error generating response: {str(e)}"
         )
 
+@router.post("/query/stream")
+async def stream_query_gemini(
+    query: schemas.GeminiQuery,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(models.get_async_db),
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    """Stream the tutor's answer as Server-Sent Events while Gemini generates it"""
+    conversation = None
+    deflection = None
+    enhanced_prompt = None
+    asked_at = datetime.utcnow()
+    if query.conversation_id is not None:
+        conversation = await conversations.get_user_conversation(db, query.conversation_id, current_user.id)
+        if query.use_cache:
+            deflection = await conversations.deflect_opening_turn(db, conversation, query.prompt, query.topic_id)
+        if deflection is None:
+            enhanced_prompt = await conversations.build_prompt(db, conversation, query.prompt, query.topic_id)
+        # The turn itself is stored only once the answer has streamed in full.
+        # Runs once the stream has finished
+        background_tasks.add_task(conversations.summarize_overflow, conversation.id)
+    else:
+        if query.use_cache:
+            deflection = await deflector.deflect(db, query.prompt, query.topic_id)
+        if deflection is None:
+            context = await retrieval_index.search(db, query.prompt, topic_id=query.topic_id)
+            enhanced_prompt = build_query_prompt(query.prompt, context)
+    # Answers that depend on conversation history are never served from the cache
+    use_cache = query.use_cache and conversation is None
+    cache_key = query_cache_key(query)
+    cached = response_cache.get("query", cache_key) if use_cache and deflection is None else None
+    # Only a stream that actually calls Gemini needs a configured client
+    client = llm.registry.get() if deflection is None and cached is None else None
+    
+    # Starlette cancels this generator when the client disconnects
+    async def event_stream():
+        if cached is not None:
+            yield format_sse({"token": cached})
+            yield format_sse({"topic_id": query.topic_id, "cached": True}, event="done")
+            return
+        
+        done = {"topic_id": query.topic_id, "cached": False}
+        chunks = []
+        if deflection is not None:
+            chunks.append(deflection.answer)
+            yield format_sse({"token": deflection.answer})
+            done.update(source=deflection.source, confidence=deflection.confidence)
+        else:
+            try:
+                async for chunk in client.stream(enhanced_prompt):
+                    chunks.append(chunk)
+                    yield format_sse({"token": chunk})
+            except asyncio.TimeoutError:
+                yield format_sse({"detail": "Timed out waiting for Gemini"}, event="error")
+                return
+            except Exception as e:
+                yield format_sse({"detail": f"Error generating response: {str(e)}"}, event="error")
+                return
+        
+        if conversation is not None:
+            # The request's session may already be closed once streaming starts
+            async with models.AsyncSessionLocal() as stream_db:
+                stream_conversation = await stream_db.get(models.Conversation, conversation.id)
+                _, message = await conversations.add_turn(
+                    stream_db, stream_conversation, query.prompt, "".join(chunks), asked_at
+                )
+            done.update(conversation_id=conversation.id, message_id=message.id)
+        elif deflection is None:
+            # Only complete answers are worth caching
+            response_cache.set("query", cache_key, "".join(chunks))
+            await deflector.record_answer(query.prompt, query.topic_id, "".join(chunks))
+        yield format_sse(done, event="done")
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def create_quiz_questions(topic: schemas.Topic, num_questions: int, use_cache: bool) -> List[schemas.Quiz]:
+    """Generate quiz questions for a topic and store them"""
+    questions_data = await generate_questions(topic, num_questions, use_cache)
+    
+    # Shared across coalesced requests, so it cannot borrow any one request's session
+    async with models.AsyncSessionLocal() as db:
+        # Create quiz questions in database
+        quiz_questions = [models.Quiz(topic_id=topic.id, **q_data) for q_data in questions_data]
+        db.add_all(quiz_questions)
+        await db.commit()
+        answer_keys.add(topic.id, quiz_questions)
+        
+        return [schemas.Quiz.model_validate(question) for question in quiz_questions]
+
 @router.post("/generate-quiz", response_model=List[schemas.Quiz])
-def generate_quiz(
+async def generate_quiz(
+    http_request: Request,
     request: schemas.QuizGenerationRequest,
-    db: Session = Depends(models.get_db),
+    db: AsyncSession = Depends(models.get_async_db),
     current_user: models.User = Depends(auth.get_current_user)
 ):
     try:
         # Get topic information
-        topic = db.query(models.Topic).filter(models.Topic.id == request.topic_id).first()
-        if not topic:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Topic not found"
-            )
+        topic = await topic_catalog.require(db, request.topic_id)
         
-        # Get configured Gemini model
-        model = get_gemini_model()
-        
-        prompt = f"""
-        Generate {request.num_questions} multiple choice questions about {topic.title}.
-        Topic description: {topic.description}
-        
-        For each question, provide:
-        1. A clear question
-        2. Four answer options (A, B, C, D)
-        3. The correct answer (A, B, C, or D)
-        4. A brief explanation of why the answer is correct
-        
-        Format your response as a JSON array with this structure:
-        [
-            {{
-                "question": "What is...",
-                "options": ["Option A", "Option B", "Option C", "Option D"],
-                "correct_answer": "A",
-                "explanation": "This is correct because..."
-            }}
-        ]
-        
-        Make sure the questions are educational and test understanding of key concepts.
-        """
+        # Draw pre-generated questions from the pool when it has enough,
+        # and top it back up in the background either way
+        quizzes = None
+        if request.use_cache:
+            quizzes = await quiz_pool.take(request.topic_id, request.num_questions)
+        quiz_pool.request_refill(request.topic_id)
+        if quizzes is not None:
+            return quizzes
         
-        response = model.generate_content(prompt)
-        
-        # Parse the JSON response
-        try:
-            # Extract JSON from response
-            json_match = re.search(r'\[.*\]', response.text, re.DOTALL)
-            if json_match:
-                json_str = json_match.group()
-                questions_data = json.loads(json_str)
-            else:
-                raise ValueError("No valid JSON found in response")
-                
-            # Create quiz questions in database
-            quiz_questions = []
-            for q_data in questions_data:
-                # Validate required fields
-                if not all(key in q_data for key in ['question', 'options', 'correct_answer']):
-                    continue
-                    
-                # Convert correct_answer letter to index
-                correct_index = ord(q_data['correct_answer'].upper()) - ord('A')
-                if correct_index < 0 or correct_index >= len(q_data['options']):
-                    correct_index = 0
-                
-                quiz_question = models.Quiz(
-                    topic_id=request.topic_id,
-                    question=q_data['question'],
-                    options=q_data['options'],
-                    correct_option=correct_index
-                )
-                db.add(quiz_question)
-                quiz_questions.append(quiz_question)
-            
-            db.commit()
-            
-            # Refresh objects to get IDs
-            for question in quiz_questions:
-                db.refresh(question)
-            
-            return quiz_questions
-            
-        except (json.JSONDecodeError, ValueError) as e:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"Error parsing generated quiz: {str(e)}"
-            )
-            
+        return await llm.cancel_on_disconnect(http_request, flights.do(
+            ("quiz", request.topic_id, request.num_questions, request.use_cache),
+            lambda: create_quiz_questions(topic, request.num_questions, request.use_cache)
+        ))
+        
+    except HTTPException:
+        raise
     except Exception as e:
-        db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error generating quiz: {str(e)}"
         )
 
-@router.post("/explain-topic/{topic_id}", response_model=schemas.GeminiResponse)
-def explain_topic(
-    topic_id: int,
-    db: Session = Depends(models.get_db),
+@router.post("/quiz-jobs", response_model=schemas.QuizJob, status_code=status.HTTP_202_ACCEPTED)
+async def create_quiz_job(
+    request: schemas.QuizJobCreate,
+    db: AsyncSession = Depends(models.get_async_db),
     current_user: models.User = Depends(auth.get_current_user)
 ):
-    try:
-        # Get topic information
-        topic = db.query(models.Topic).filter(models.Topic.id == topic_id).first()
-        if not topic:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Topic not found"
-            )
-        
-        # Get configured Gemini model
-        model = get_gemini_model()
-        
-        prompt = f"""
+    """Queue quiz generation for several topics; poll the job or stream its events for progress"""
+    return await quiz_jobs.submit(db, current_user.id, request)
+
+@router.get("/quiz-jobs/stats")
+async def get_quiz_job_stats(current_user: models.User = Depends(auth.get_current_user)):
+    return quiz_jobs.stats()
+
+@router.get("/quiz-jobs/{job_id}", response_model=schemas.QuizJob)
+async def get_quiz_job(
+    job_id: int,
+    db: AsyncSession = Depends(models.get_async_db),
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    return await quiz_jobs.get(db, job_id, current_user.id)
+
+@router.get("/quiz-jobs/{job_id}/events")
+async def stream_quiz_job(
+    job_id: int,
+    db: AsyncSession = Depends(models.get_async_db),
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    """Stream a job's progress as Server-Sent Events, ending with a done event once every task has finished"""
+    await quiz_jobs.get(db, job_id, current_user.id)
+    user_id = current_user.id
+    
+    async def event_stream():
+        previous = None
+        while True:
+            # A fresh session per read, so task rows are not served from the identity map
+            async with models.AsyncSessionLocal() as stream_db:
+                job = await quiz_jobs.get(stream_db, job_id, user_id)
+            payload = job.model_dump(mode="json")
+            if job.status in ("done", "failed"):
+                yield format_sse(payload, event="done")
+                return
+            if payload != previous:
+                yield format_sse(payload, event="progress")
+                previous = payload
+            await quiz_jobs.wait_for_change()
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.post("/quiz-jobs/{job_id}/retry", response_model=schemas.QuizJob)
+async def retry_quiz_job(
+    job_id: int,
+    db: AsyncSession = Depends(models.get_async_db),
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    """Run a job's failed topics again, leaving the finished ones alone"""
+    return await quiz_jobs.retry(db, job_id, current_user.id)
+
+def build_explain_prompt(topic: schemas.Topic) -> str:
+    return f"""
         Explain {topic.title} in the context of Machine Learning and AI.
         
         Topic: {topic.description}
@@ -205,26 +314,120 @@ def explain_topic(
         
         Keep the explanation educational and suitable for students.
         """
-        
-        response = model.generate_content(prompt)
-        
-        # Store the explanation in the database
+
+async def create_explanation(topic: schemas.Topic, use_cache: bool) -> str:
+    """Generate an explanation for a topic and store it as content"""
+    response_text = await llm.generate_text(build_explain_prompt(topic), "explain", use_cache)
+    
+    # Store the explanation in the database
+    async with models.AsyncSessionLocal() as db:
         content = models.Content(
-            topic_id=topic_id,
-            summary_text=response.text
+            topic_id=topic.id,
+            summary_text=response_text
         )
         db.add(content)
-        db.commit()
-        db.refresh(content)
+        await db.commit()
+        await retrieval_index.add_content(content)
+    
+    return response_text
+
+async def refresh_explanation(topic: schemas.Topic) -> None:
+    """Regenerate a stale explanation after the stored one has been served"""
+    try:
+        await flights.do(("explain", topic.id, False), lambda: create_explanation(topic, use_cache=False))
+    except Exception:
+        logger.exception("Background refresh of explanation for topic %s failed", topic.id)
+
+@router.post("/explain-topic/{topic_id}", response_model=schemas.GeminiResponse)
+async def explain_topic(
+    request: Request,
+    topic_id: int,
+    background_tasks: BackgroundTasks,
+    use_cache: bool = True,
+    refresh: bool = False,
+    db: AsyncSession = Depends(models.get_async_db),
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    try:
+        # Get topic information
+        topic = await topic_catalog.require(db, topic_id)
+        
+        # Serve the latest stored explanation, refreshing it in the background once stale.
+        # use_cache=false and refresh=true both skip it and generate afresh
+        if use_cache and not refresh:
+            latest = await db.scalar(
+                select(models.Content)
+                .where(models.Content.topic_id == topic_id)
+                .order_by(models.Content.created_at.desc())
+                .limit(1)
+            )
+            if latest:
+                age = datetime.utcnow() - latest.created_at
+                if age > timedelta(seconds=EXPLANATION_MAX_AGE_SECONDS):
+                    background_tasks.add_task(refresh_explanation, topic)
+                return schemas.GeminiResponse(
+                    response=latest.summary_text,
+                    topic_id=topic_id
+                )
+        
+        use_cache = use_cache and not refresh
+        response_text = await llm.cancel_on_disconnect(request, flights.do(
+            ("explain", topic_id, use_cache),
+            lambda: create_explanation(topic, use_cache)
+        ))
         
         return schemas.GeminiResponse(
-            response=response.text,
+            response=response_text,
             topic_id=topic_id
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
-        db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error explaining topic: {str(e)}"
         )
+
+@router.get("/cache/stats")
+async def get_cache_stats(current_user: models.User = Depends(auth.get_current_user)):
+    return response_cache.stats()
+
+@router.get("/coalescing/stats")
+async def get_coalescing_stats(current_user: models.User = Depends(auth.get_current_user)):
+    return flights.stats()
+
+@router.get("/quiz-pool/stats")
+async def get_quiz_pool_stats(
+    db: AsyncSession = Depends(models.get_async_db),
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    return await quiz_pool.stats(db)
+
+@router.get("/quiz-generation/stats")
+async def get_quiz_generation_stats(current_user: models.User = Depends(auth.get_current_user)):
+    return parse_stats.stats()
+
+@router.get("/deflection/stats")
+async def get_deflection_stats(current_user: models.User = Depends(auth.get_current_user)):
+    return deflector.stats()
+
+@router.get("/retrieval/stats")
+async def get_retrieval_stats(current_user: models.User = Depends(auth.get_current_user)):
+    return retrieval_index.stats()
+
+@router.get("/admin/models")
+async def get_model_stats(admin_user: models.User = Depends(auth.get_admin_user)):
+    return llm.registry.stats()
+
+@router.post("/admin/reload")
+async def reload_models(admin_user: models.User = Depends(auth.get_admin_user)):
+    """Reload Gemini credentials from .env and rebuild every model handle"""
+    try:
+        llm.registry.reload()
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error configuring Gemini API: {str(e)}"
+        )
+    return llm.registry.stats()
@@ -1,84 +1,149 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
-from .. import models, schemas, auth
+from .. import models, schemas, auth, progress
+from ..answer_keys import answer_keys
+from ..http_cache import conditional_get
+from ..leaderboard import leaderboards
+from ..pagination import PageParams, fetch_page, page_response
+from ..topic_catalog import topic_catalog
 
 router = APIRouter(prefix="/quiz", tags=["quiz"])
 
 @router.get("/{topic_id}", response_model=List[schemas.QuizQuestion])
-def get_quiz_questions(topic_id: int, db: Session = Depends(models.get_db)):
+async def get_quiz_questions(
+    topic_id: int,
+    request: Request,
+    response: Response,
+    page: PageParams = Depends(),
+    db: AsyncSession = Depends(models.get_async_db)
+):
+    not_modified = await conditional_get(request, response, db, "topics", "quizzes")
+    if not_modified:
+        return not_modified
     # Check if topic exists
-    topic = db.query(models.Topic).filter(models.Topic.id == topic_id).first()
-    if not topic:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Topic not found"
-        )
+    await topic_catalog.require(db, topic_id)
     
-    quizzes = db.query(models.Quiz).filter(models.Quiz.topic_id == topic_id).all()
-    return [
-        schemas.QuizQuestion(
-            id=quiz.id,
-            question=quiz.question,
-            options=quiz.options
-        )
-        for quiz in quizzes
-    ]
+    # Only QuizQuestion's columns are loaded, so correct_option never leaves the database
+    return page_response(response, await fetch_page(
+        db, models.Quiz, schemas.QuizQuestion, page, models.Quiz.topic_id == topic_id
+    ))
+
+@router.get("/answer-keys/stats")
+async def get_answer_key_stats(current_user: models.User = Depends(auth.get_current_user)):
+    return answer_keys.stats()
 
 @router.post("/submit", response_model=schemas.UserScore)
-def submit_quiz(
+async def submit_quiz(
     submission: schemas.QuizSubmissionList,
-    db: Session = Depends(models.get_db),
-    current_user: models.User = Depends(auth.get_current_user)
+    db: AsyncSession = Depends(models.get_async_db),
+    current_user_id: int = Depends(auth.get_current_user_id)
 ):
     # Check if topic exists
-    topic = db.query(models.Topic).filter(models.Topic.id == submission.topic_id).first()
-    if not topic:
+    await topic_catalog.require(db, submission.topic_id)
+    
+    # Grade against the cached answer key, loaded in one query on first use
+    quiz_ids = {sub.quiz_id for sub in submission.submissions}
+    answer_key = await answer_keys.lookup(db, submission.topic_id, quiz_ids) if quiz_ids else {}
+    
+    unknown_ids = sorted(quiz_ids - answer_key.keys())
+    if unknown_ids:
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Topic not found"
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Quiz questions {unknown_ids} do not belong to topic {submission.topic_id}"
         )
     
     # Calculate score
-    score = 0
+    results = [
+        (sub, answer_key[sub.quiz_id] == sub.selected_option)
+        for sub in submission.submissions
+    ]
+    score = sum(1 for _, is_correct in results if is_correct)
     total_questions = len(submission.submissions)
     
-    for sub in submission.submissions:
-        quiz = db.query(models.Quiz).filter(models.Quiz.id == sub.quiz_id).first()
-        if quiz and quiz.correct_option == sub.selected_option:
-            score += 1
-    
-    # Save score
+    # Save score with per-question results
     db_score = models.UserScore(
-        user_id=current_user.id,
+        user_id=current_user_id,
         topic_id=submission.topic_id,
         score=score,
         total_questions=total_questions
     )
+    db_score.answers = [
+        models.QuizAnswer(
+            quiz_id=sub.quiz_id,
+            selected_option=sub.selected_option,
+            is_correct=is_correct
+        )
+        for sub, is_correct in results
+    ]
     db.add(db_score)
-    db.commit()
-    db.refresh(db_score)
+    await db.flush()
+    rollup = await progress.record_attempt(db, db_score)
+    await db.commit()
+    await db.refresh(db_score)
+    leaderboards.record(rollup.user_id, rollup.topic_id, rollup.best_percentage, rollup.attempts, rollup.latest_at)
     
     return db_score
 
 @router.get("/scores/{topic_id}", response_model=List[schemas.UserScore])
-def get_user_scores(
+async def get_user_scores(
     topic_id: int,
-    db: Session = Depends(models.get_db),
-    current_user: models.User = Depends(auth.get_current_user)
+    response: Response,
+    page: PageParams = Depends(),
+    db: AsyncSession = Depends(models.get_async_db),
+    current_user_id: int = Depends(auth.get_current_user_id)
 ):
-    scores = db.query(models.UserScore).filter(
-        models.UserScore.user_id == current_user.id,
+    return page_response(response, await fetch_page(
+        db, models.UserScore, schemas.UserScore, page,
+        models.UserScore.user_id == current_user_id,
         models.UserScore.topic_id == topic_id
-    ).all()
-    return scores
+    ))
+
+@router.get("/progress/summary", response_model=schemas.ProgressSummary)
+async def get_user_progress_summary(
+    db: AsyncSession = Depends(models.get_async_db),
+    current_user_id: int = Depends(auth.get_current_user_id)
+):
+    """Per-topic attempts, best, latest and average score; one rollup row per topic attempted"""
+    return await progress.summarize(db, current_user_id)
+
+@router.get("/leaderboard/stats")
+async def get_leaderboard_stats(current_user: models.User = Depends(auth.get_current_user)):
+    return leaderboards.stats()
+
+@router.get("/leaderboard/{topic_id}", response_model=schemas.Leaderboard)
+async def get_leaderboard(
+    topic_id: int,
+    limit: int = Query(10, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    db: AsyncSession = Depends(models.get_async_db),
+    current_user_id: int = Depends(auth.get_current_user_id)
+):
+    await topic_catalog.require(db, topic_id)
+    return await leaderboards.top(db, topic_id, limit, offset)
+
+@router.get("/leaderboard/{topic_id}/me", response_model=schemas.LeaderboardEntry)
+async def get_my_leaderboard_rank(
+    topic_id: int,
+    db: AsyncSession = Depends(models.get_async_db),
+    current_user_id: int = Depends(auth.get_current_user_id)
+):
+    await topic_catalog.require(db, topic_id)
+    entry = await leaderboards.rank(db, topic_id, current_user_id)
+    if entry is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No attempts at this topic yet"
+        )
+    return entry
 
 @router.get("/progress/", response_model=List[schemas.UserScore])
-def get_user_progress(
-    db: Session = Depends(models.get_db),
-    current_user: models.User = Depends(auth.get_current_user)
+async def get_user_progress(
+    response: Response,
+    page: PageParams = Depends(),
+    db: AsyncSession = Depends(models.get_async_db),
+    current_user_id: int = Depends(auth.get_current_user_id)
 ):
-    scores = db.query(models.UserScore).filter(
-        models.UserScore.user_id == current_user.id
-    ).all()
-    return scores
+    return page_response(response, await fetch_page(
+        db, models.UserScore, schemas.UserScore, page, models.UserScore.user_id == current_user_id
+    ))
@@ -0,0 +1,22 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from .. import models, schemas, search
+
+router = APIRouter(prefix="/search", tags=["search"])
+
+@router.get("", response_model=schemas.SearchResults)
+async def search_topics_and_content(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    db: AsyncSession = Depends(models.get_async_db)
+):
+    """Ranked full-text matches over topic titles, descriptions and stored content, with highlighted snippets"""
+    rows = await search.search(db, q, limit, offset)
+    return schemas.SearchResults(
+        query=q,
+        results=rows[:limit],
+        limit=limit,
+        offset=offset,
+        has_more=len(rows) > limit
+    )
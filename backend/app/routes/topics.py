@@ -1,70 +1,95 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 from .. import models, schemas, auth
+from ..deflection import deflector
+from ..http_cache import conditional_get
+from ..pagination import PageParams, fetch_page, page_of, page_response
+from ..retrieval import retrieval_index
+from ..topic_catalog import topic_catalog
 
 router = APIRouter(prefix="/topics", tags=["topics"])
 
 @router.get("/", response_model=List[schemas.Topic])
-def get_topics(db: Session = Depends(models.get_db)):
-    topics = db.query(models.Topic).all()
-    return topics
+async def get_topics(
+    request: Request,
+    response: Response,
+    page: PageParams = Depends(),
+    db: AsyncSession = Depends(models.get_async_db)
+):
+    not_modified = await conditional_get(request, response, db, "topics")
+    if not_modified:
+        return not_modified
+    # The body must be no older than the ETag, or clients would keep a stale list under a current tag
+    await topic_catalog.ensure_version(db, request.state.table_versions["topics"])
+    return page_response(response, page_of(await topic_catalog.list(db), schemas.Topic, page))
 
 @router.post("/", response_model=schemas.Topic)
-def create_topic(
+async def create_topic(
     topic: schemas.TopicCreate, 
-    db: Session = Depends(models.get_db),
+    db: AsyncSession = Depends(models.get_async_db),
     current_user: models.User = Depends(auth.get_current_user)
 ):
     db_topic = models.Topic(**topic.dict())
     db.add(db_topic)
-    db.commit()
-    db.refresh(db_topic)
+    await db.commit()
+    await db.refresh(db_topic)
+    topic_catalog.put(db_topic)
+    await deflector.add_topic(db_topic)
     return db_topic
 
+@router.get("/catalog/stats")
+async def get_topic_catalog_stats(current_user: models.User = Depends(auth.get_current_user)):
+    return topic_catalog.stats()
+
 @router.get("/{topic_id}", response_model=schemas.Topic)
-def get_topic(topic_id: int, db: Session = Depends(models.get_db)):
-    topic = db.query(models.Topic).filter(models.Topic.id == topic_id).first()
-    if not topic:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Topic not found"
-        )
-    return topic
+async def get_topic(
+    topic_id: int,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(models.get_async_db)
+):
+    not_modified = await conditional_get(request, response, db, "topics")
+    if not_modified:
+        return not_modified
+    await topic_catalog.ensure_version(db, request.state.table_versions["topics"])
+    return await topic_catalog.require(db, topic_id)
 
 @router.get("/{topic_id}/content", response_model=List[schemas.Content])
-def get_topic_content(topic_id: int, db: Session = Depends(models.get_db)):
+async def get_topic_content(
+    topic_id: int,
+    request: Request,
+    response: Response,
+    page: PageParams = Depends(),
+    db: AsyncSession = Depends(models.get_async_db)
+):
+    not_modified = await conditional_get(request, response, db, "topics", "content")
+    if not_modified:
+        return not_modified
     # Check if topic exists
-    topic = db.query(models.Topic).filter(models.Topic.id == topic_id).first()
-    if not topic:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Topic not found"
-        )
+    await topic_catalog.require(db, topic_id)
     
-    content = db.query(models.Content).filter(models.Content.topic_id == topic_id).all()
-    return content
+    # `?fields=id,created_at` lists explanations without loading their multi-kilobyte text
+    return page_response(response, await fetch_page(
+        db, models.Content, schemas.Content, page, models.Content.topic_id == topic_id
+    ))
 
 @router.post("/{topic_id}/content", response_model=schemas.Content)
-def create_content(
+async def create_content(
     topic_id: int,
     content: schemas.ContentBase,
-    db: Session = Depends(models.get_db),
+    db: AsyncSession = Depends(models.get_async_db),
     current_user: models.User = Depends(auth.get_current_user)
 ):
     # Check if topic exists
-    topic = db.query(models.Topic).filter(models.Topic.id == topic_id).first()
-    if not topic:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Topic not found"
-        )
+    await topic_catalog.require(db, topic_id)
     
     db_content = models.Content(
         topic_id=topic_id,
         summary_text=content.summary_text
     )
     db.add(db_content)
-    db.commit()
-    db.refresh(db_content)
+    await db.commit()
+    await db.refresh(db_content)
+    await retrieval_index.add_content(db_content)
     return db_content
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr
-from typing import Optional, List
+from typing import Dict, Optional, List
 from datetime import datetime
 
 # User schemas
@@ -116,18 +116,102 @@ class UserScore(UserScoreBase):
     class Config:
         from_attributes = True
 
+class TopicProgress(BaseModel):
+    topic_id: int
+    attempts: int
+    average_percentage: float
+    best_score: int
+    best_total_questions: int
+    best_percentage: float
+    latest_score: int
+    latest_total_questions: int
+    latest_percentage: float
+    latest_at: datetime
+
+class ProgressSummary(BaseModel):
+    topics: List[TopicProgress]
+    topics_attempted: int
+    total_attempts: int
+    # Mean of each topic's latest percentage
+    average_latest_percentage: float
+
+class LeaderboardEntry(BaseModel):
+    rank: int
+    user_id: int
+    name: str
+    best_percentage: float
+    attempts: int
+    latest_at: datetime
+
+class Leaderboard(BaseModel):
+    topic_id: int
+    total_users: int
+    entries: List[LeaderboardEntry]
+
+# Bulk import schemas
+class BulkImportError(BaseModel):
+    line: int
+    error: str
+
+class BulkImportReport(BaseModel):
+    lines: int
+    # Rows inserted per record type; topics matched by title are not counted
+    inserted: Dict[str, int]
+    error_count: int
+    # The first errors only; error_count has the total
+    errors: List[BulkImportError]
+
 # Gemini schemas
 class GeminiQuery(BaseModel):
     prompt: str
     topic_id: Optional[int] = None
+    use_cache: bool = True
+    # Continue a stored conversation; its history goes into the prompt and the turn is saved
+    conversation_id: Optional[int] = None
 
 class GeminiResponse(BaseModel):
     response: str
     topic_id: Optional[int] = None
+    # Set when the answer was served locally instead of by Gemini
+    source: Optional[str] = None
+    confidence: Optional[float] = None
 
 class QuizGenerationRequest(BaseModel):
     topic_id: int
     num_questions: int = 5
+    use_cache: bool = True
+
+class QuizJobItem(BaseModel):
+    topic_id: int
+    num_questions: int = 5
+
+class QuizJobCreate(BaseModel):
+    items: List[QuizJobItem]
+    # Seeding wants fresh questions; True reuses cached generations of identical prompts
+    use_cache: bool = False
+
+class QuizJobTask(BaseModel):
+    id: int
+    topic_id: int
+    num_questions: int
+    status: str
+    generated: int
+    attempts: int
+    error: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+class QuizJob(BaseModel):
+    id: int
+    status: str  # "pending", "running", "done" or "failed" (finished with failed tasks)
+    total: int
+    done: int
+    failed: int
+    questions_generated: int
+    created_at: datetime
+    updated_at: datetime
+    tasks: List[QuizJobTask]
 
 class GeneratedQuiz(BaseModel):
     topic_id: int
@@ -137,3 +221,55 @@ class TopicExplanation(BaseModel):
     topic_id: int
     topic_title: str
     explanation: str
+
+# Conversation schemas
+class ConversationCreate(BaseModel):
+    title: Optional[str] = None
+    topic_id: Optional[int] = None
+
+class Conversation(ConversationCreate):
+    id: int
+    summary: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class ConversationMessage(BaseModel):
+    id: int
+    conversation_id: int
+    role: str
+    content: str
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class ConversationMessageCreate(BaseModel):
+    prompt: str
+
+class ConversationTurn(BaseModel):
+    user_message: ConversationMessage
+    assistant_message: ConversationMessage
+
+class ConversationMessagePage(BaseModel):
+    messages: List[ConversationMessage]
+    # Pass as `before` to fetch the next older page; None once the start is reached
+    next_before: Optional[int] = None
+
+# Search schemas
+class SearchResult(BaseModel):
+    kind: str  # "topic" or "content"
+    ref_id: int
+    topic_id: int
+    title: str
+    snippet: str
+    rank: float
+
+class SearchResults(BaseModel):
+    query: str
+    results: List[SearchResult]
+    limit: int
+    offset: int
+    has_more: bool
@@ -0,0 +1,166 @@
+import os
+import re
+from typing import List, Optional
+from sqlalchemy import Engine, or_, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import models
+
+# When set, only the newest this many matches are ranked, which bounds the cost of
+# very common terms but drops older matches; 0 ranks every match
+SEARCH_MAX_CANDIDATES = int(os.getenv("SEARCH_MAX_CANDIDATES", "0"))
+
+# Prefix lengths FTS5 keeps an index for; longer prefixes still match, by merging
+# the doclists of every matching term on each query
+SEARCH_PREFIX_LENGTHS = (2, 3, 4)
+
+# Topics and content share one FTS5 table. Content rows use rowid id and topic rows
+# rowid 2**62 + id, above all content, so triggers update rows by rowid and topics
+# are always among the newest matches
+SEARCH_INDEX_DDL = [
+    f"""
+    CREATE VIRTUAL TABLE search_index USING fts5(
+        kind UNINDEXED, ref_id UNINDEXED, topic_id UNINDEXED, title, body,
+        tokenize = 'porter unicode61', prefix = '{" ".join(map(str, SEARCH_PREFIX_LENGTHS))}'
+    )
+    """,
+    """
+    INSERT INTO search_index(rowid, kind, ref_id, topic_id, title, body)
+    SELECT (1 << 62) + id, 'topic', id, id, title, coalesce(description, '') FROM topics
+    """,
+    """
+    INSERT INTO search_index(rowid, kind, ref_id, topic_id, title, body)
+    SELECT content.id, 'content', content.id, content.topic_id, coalesce(topics.title, ''), content.summary_text
+    FROM content LEFT JOIN topics ON topics.id = content.topic_id
+    """,
+]
+
+SEARCH_TRIGGERS_DDL = [
+    """
+    CREATE TRIGGER IF NOT EXISTS search_topics_insert AFTER INSERT ON topics BEGIN
+        INSERT INTO search_index(rowid, kind, ref_id, topic_id, title, body)
+        VALUES ((1 << 62) + new.id, 'topic', new.id, new.id, new.title, coalesce(new.description, ''));
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS search_topics_update AFTER UPDATE ON topics BEGIN
+        DELETE FROM search_index WHERE rowid = (1 << 62) + old.id;
+        INSERT INTO search_index(rowid, kind, ref_id, topic_id, title, body)
+        VALUES ((1 << 62) + new.id, 'topic', new.id, new.id, new.title, coalesce(new.description, ''));
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS search_topics_delete AFTER DELETE ON topics BEGIN
+        DELETE FROM search_index WHERE rowid = (1 << 62) + old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS search_content_insert AFTER INSERT ON content BEGIN
+        INSERT INTO search_index(rowid, kind, ref_id, topic_id, title, body)
+        VALUES (new.id, 'content', new.id, new.topic_id,
+                coalesce((SELECT title FROM topics WHERE id = new.topic_id), ''), new.summary_text);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS search_content_update AFTER UPDATE ON content BEGIN
+        DELETE FROM search_index WHERE rowid = old.id;
+        INSERT INTO search_index(rowid, kind, ref_id, topic_id, title, body)
+        VALUES (new.id, 'content', new.id, new.topic_id,
+                coalesce((SELECT title FROM topics WHERE id = new.topic_id), ''), new.summary_text);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS search_content_delete AFTER DELETE ON content BEGIN
+        DELETE FROM search_index WHERE rowid = old.id;
+    END
+    """,
+]
+
+# Title matches count for more than body matches; the UNINDEXED columns get no weight
+SEARCH_QUERY = text("""
+    SELECT kind, ref_id, topic_id, title,
+           snippet(search_index, 4, '<mark>', '</mark>', '…', 16) AS snippet,
+           bm25(search_index, 0, 0, 0, 5.0, 1.0) AS rank
+    FROM search_index
+    WHERE search_index MATCH :match AND rowid >= :floor
+    ORDER BY rank
+    LIMIT :limit OFFSET :offset
+""")
+# Walking matches in rowid order needs no scoring, so finding the cut-off is cheap
+CANDIDATE_FLOOR_QUERY = text("""
+    SELECT rowid FROM search_index
+    WHERE search_index MATCH :match
+    ORDER BY rowid DESC
+    LIMIT 1 OFFSET :candidates
+""")
+
+_term_re = re.compile(r"\w+")
+
+def create_search_index(engine: Engine) -> None:
+    """Create and backfill the FTS5 table and the triggers that keep it in sync (SQLite only)"""
+    if engine.dialect.name != "sqlite":
+        return
+    with engine.begin() as conn:
+        exists = conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'search_index'")
+        ).first()
+        if not exists:
+            for statement in SEARCH_INDEX_DDL:
+                conn.execute(text(statement))
+        for statement in SEARCH_TRIGGERS_DDL:
+            conn.execute(text(statement))
+
+def build_match_query(query: str) -> Optional[str]:
+    """Turn free text into an FTS5 query: every term must match, the last one as a prefix
+
+    The last term is the one still being typed, so "backprop" finds "Backpropagation".
+    """
+    terms = _term_re.findall(query.lower())
+    if not terms:
+        return None
+    # Quoting keeps FTS5 operators and column filters typed by users from being interpreted
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+async def search(db: AsyncSession, query: str, limit: int, offset: int) -> List[dict]:
+    """Ranked matches across topics and content, best first; one more row than `limit` if more exist"""
+    match = build_match_query(query)
+    if match is None:
+        return []
+    if db.bind.dialect.name != "sqlite":
+        return await _search_without_fts(db, query, limit, offset)
+
+    floor = None
+    if SEARCH_MAX_CANDIDATES > 0:
+        floor = await db.scalar(CANDIDATE_FLOOR_QUERY, {"match": match, "candidates": SEARCH_MAX_CANDIDATES - 1})
+    rows = (await db.execute(
+        SEARCH_QUERY, {"match": match, "floor": floor or 0, "limit": limit + 1, "offset": offset}
+    )).mappings().all()
+    return [dict(row) for row in rows]
+
+async def _search_without_fts(db: AsyncSession, query: str, limit: int, offset: int) -> List[dict]:
+    # Unranked substring match for databases without FTS5; topics first, then content
+    pattern = f"%{query}%"
+    topics = (await db.scalars(
+        select(models.Topic)
+        .where(or_(models.Topic.title.ilike(pattern), models.Topic.description.ilike(pattern)))
+        .order_by(models.Topic.id)
+    )).all()
+    results = [
+        {"kind": "topic", "ref_id": t.id, "topic_id": t.id, "title": t.title,
+         "snippet": (t.description or "")[:200], "rank": 0.0}
+        for t in topics
+    ]
+    if len(results) < offset + limit + 1:
+        contents = (await db.scalars(
+            select(models.Content)
+            .where(models.Content.summary_text.ilike(pattern))
+            .order_by(models.Content.id)
+            .limit(offset + limit + 1 - len(results))
+        )).all()
+        results += [
+            {"kind": "content", "ref_id": c.id, "topic_id": c.topic_id, "title": "",
+             "snippet": c.summary_text[:200], "rank": 0.0}
+            for c in contents
+        ]
+    return results[offset:offset + limit + 1]
@@ -0,0 +1,118 @@
+import asyncio
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+from fastapi import HTTPException, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import models, schemas
+
+# How often a worker checks whether another worker has changed the topics table
+TOPIC_CATALOG_REFRESH_SECONDS = float(os.getenv("TOPIC_CATALOG_REFRESH_SECONDS", "5"))
+
+class TopicCatalog:
+    """Process-wide snapshot of the topics table, so topic lookups and listings skip the database
+
+    Topics created by this worker are added as they are written. Changes made
+    by other workers are picked up by comparing the topics counter in
+    table_versions, at most once per refresh interval.
+    """
+
+    def __init__(self, refresh_interval: float = TOPIC_CATALOG_REFRESH_SECONDS):
+        self.refresh_interval = refresh_interval
+        self._topics: Dict[int, schemas.Topic] = {}
+        self._version: Optional[int] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._load_lock = asyncio.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+
+    async def load(self, db: AsyncSession) -> None:
+        """Replace the snapshot with the current contents of the topics table"""
+        async with self._load_lock:
+            # Read the version first: a write landing in between only causes one extra reload
+            version = await self._current_version(db)
+            topics = (await db.scalars(select(models.Topic).order_by(models.Topic.id))).all()
+            snapshot = {topic.id: schemas.Topic.model_validate(topic) for topic in topics}
+            with self._lock:
+                self._topics = snapshot
+                self._version = version
+                self._checked_at = time.monotonic()
+                self.reloads += 1
+
+    async def _current_version(self, db: AsyncSession) -> Optional[int]:
+        return await db.scalar(
+            select(models.TableVersion.version).where(models.TableVersion.table_name == "topics")
+        )
+
+    async def _refresh_if_stale(self, db: AsyncSession) -> None:
+        if self._version is not None and time.monotonic() - self._checked_at < self.refresh_interval:
+            return
+        version = await self._current_version(db)
+        if self._version is None or version != self._version:
+            await self.load(db)
+        else:
+            self._checked_at = time.monotonic()
+
+    async def ensure_version(self, db: AsyncSession, version: int) -> None:
+        """Reload unless the snapshot is at least as new as `version`, e.g. the one an ETag was built from"""
+        if self._version is None or self._version < version:
+            await self.load(db)
+
+    async def get(self, db: AsyncSession, topic_id: int) -> Optional[schemas.Topic]:
+        await self._refresh_if_stale(db)
+        with self._lock:
+            topic = self._topics.get(topic_id)
+            if topic is not None:
+                self.hits += 1
+                return topic
+            self.misses += 1
+
+        # Possibly created by another worker since the last refresh
+        row = await db.get(models.Topic, topic_id)
+        return self.put(row) if row is not None else None
+
+    async def require(self, db: AsyncSession, topic_id: int) -> schemas.Topic:
+        """The topic, or a 404 when it does not exist"""
+        topic = await self.get(db, topic_id)
+        if topic is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Topic not found"
+            )
+        return topic
+
+    async def list(self, db: AsyncSession) -> List[schemas.Topic]:
+        """Every topic, in id order"""
+        await self._refresh_if_stale(db)
+        with self._lock:
+            self.hits += 1
+            return sorted(self._topics.values(), key=lambda topic: topic.id)
+
+    def put(self, topic: models.Topic) -> schemas.Topic:
+        """Record a newly committed or updated topic"""
+        snapshot = schemas.Topic.model_validate(topic)
+        with self._lock:
+            self._topics[snapshot.id] = snapshot
+        return snapshot
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._version = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "topics": len(self._topics),
+                "version": self._version,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "reloads": self.reloads,
+            }
+
+topic_catalog = TopicCatalog()
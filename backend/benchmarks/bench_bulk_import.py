@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Time an NDJSON import and export of a large question bank against a throwaway database.
+
+    python benchmarks/bench_bulk_import.py --questions 100000 --topics 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+async def lines(topics: int, questions: int):
+    for i in range(1, topics + 1):
+        yield json.dumps({"type": "topic", "id": i, "title": f"Topic {i}", "description": f"Description {i}"}).encode()
+        yield json.dumps({"type": "content", "topic_id": i, "summary_text": f"Summary of topic {i}"}).encode()
+    for i in range(questions):
+        yield json.dumps({
+            "type": "quiz", "topic_id": i % topics + 1, "question": f"Question {i}?",
+            "options": ["first", "second", "third", "fourth"], "correct_option": i % 4,
+        }).encode()
+
+async def run(topics: int, questions: int) -> None:
+    sys.path.insert(0, BACKEND_DIR)
+    from app import bulk, models
+
+    models.create_tables()
+    async with models.AsyncSessionLocal() as db:
+        started = time.perf_counter()
+        report = await bulk.import_ndjson(db, lines(topics, questions))
+        elapsed = time.perf_counter() - started
+        print(f"imported {report.inserted} in {elapsed:.1f}s ({report.lines / elapsed:,.0f} lines/s), "
+              f"{report.error_count} errors")
+
+        started = time.perf_counter()
+        size = 0
+        async for chunk in bulk.export_ndjson(db):
+            size += len(chunk)
+        print(f"exported {size / 1e6:.1f} MB in {time.perf_counter() - started:.1f}s")
+    await models.async_engine.dispose()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--questions", type=int, default=100_000)
+    parser.add_argument("--topics", type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        asyncio.run(run(args.topics, args.questions))
+
+if __name__ == "__main__":
+    main()
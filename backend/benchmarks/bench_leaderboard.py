@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Measure leaderboard update and rank-lookup latency for one topic with many users.
+
+The board is bulk-loaded, as at startup from user_topic_progress:
+
+    python benchmarks/bench_leaderboard.py --users 1000000 --operations 100000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from app.leaderboard import Standing, TopicLeaderboard
+
+def percentile(values, fraction):
+    return values[min(int(len(values) * fraction), len(values) - 1)] * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--operations", type=int, default=100_000)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    start = datetime(2024, 1, 1)
+    board = TopicLeaderboard()
+
+    standings = {
+        user_id: Standing(
+            rng.randint(0, 20) * 5.0, rng.randint(1, 30), start + timedelta(seconds=rng.randint(0, 10**7))
+        )
+        for user_id in range(1, args.users + 1)
+    }
+    started = time.perf_counter()
+    board.load(standings)
+    print(f"built board of {len(board)} users in {time.perf_counter() - started:.1f}s")
+
+    updates, ranks, tops = [], [], []
+    for i in range(args.operations):
+        user_id = rng.randint(1, args.users)
+        current = board.standing(user_id)
+        standing = Standing(
+            max(current.best_percentage, rng.randint(0, 20) * 5.0), current.attempts + 1,
+            current.latest_at + timedelta(seconds=1)
+        )
+        t = time.perf_counter()
+        board.update(user_id, standing)
+        updates.append(time.perf_counter() - t)
+
+        t = time.perf_counter()
+        board.rank(rng.randint(1, args.users))
+        ranks.append(time.perf_counter() - t)
+
+        if i % 10 == 0:
+            t = time.perf_counter()
+            board.top(10)
+            tops.append(time.perf_counter() - t)
+
+    for label, latencies in (("update", updates), ("rank", ranks), ("top 10", tops)):
+        latencies.sort()
+        print(f"{label:>7}: p50 {percentile(latencies, 0.5):.1f} us  p99 {percentile(latencies, 0.99):.1f} us")
+
+if __name__ == "__main__":
+    main()
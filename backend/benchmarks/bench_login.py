@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Measure password verification (login) throughput per core for each way of running bcrypt.
+
+Each configuration runs in a fresh process with --clients concurrent logins on one event loop:
+
+    python benchmarks/bench_login.py --clients 32 --logins 20 --rounds 12
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CONFIGS = {
+    # What the login route used to do: bcrypt on Starlette's shared request threadpool
+    "threadpool": {},
+    "thread": {"PASSWORD_HASH_EXECUTOR": "thread"},
+    "process": {"PASSWORD_HASH_EXECUTOR": "process"},
+}
+
+async def run_worker(config: str, clients: int, logins: int) -> dict:
+    sys.path.insert(0, BACKEND_DIR)
+    from fastapi.concurrency import run_in_threadpool
+    from app import auth
+    from app.passwords import password_hasher
+
+    hashed = auth.get_password_hash("correct horse battery staple")
+    if config == "threadpool":
+        async def verify():
+            return await run_in_threadpool(auth.verify_password, "correct horse battery staple", hashed)
+    else:
+        password_hasher.start()
+        async def verify():
+            return (await password_hasher.verify_and_update("correct horse battery staple", hashed))[0]
+        # Spawned worker processes pay their import cost up front, not inside the timing
+        await asyncio.gather(*(verify() for _ in range(password_hasher.workers)))
+
+    latencies = []
+
+    async def login_many():
+        for _ in range(logins):
+            started = time.perf_counter()
+            assert await verify()
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(login_many() for _ in range(clients)))
+    elapsed = time.perf_counter() - started
+    password_hasher.stop()
+
+    latencies.sort()
+    cores = os.cpu_count() or 1
+    return {
+        "logins": len(latencies),
+        "seconds": round(elapsed, 3),
+        "per_second": round(len(latencies) / elapsed, 1),
+        "per_core": round(len(latencies) / elapsed / cores, 1),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 2),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99)] * 1000, 2),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clients", type=int, default=32, help="concurrent logins")
+    parser.add_argument("--logins", type=int, default=20, help="logins per client")
+    parser.add_argument("--rounds", type=int, default=12, help="bcrypt cost")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(asyncio.run(run_worker(args.worker, args.clients, args.logins))))
+        return
+
+    print(f"{args.clients} clients x {args.logins} logins, bcrypt cost {args.rounds}, {os.cpu_count()} cores")
+    for name, overrides in CONFIGS.items():
+        env = os.environ.copy()
+        env.update(overrides)
+        env["BCRYPT_ROUNDS"] = str(args.rounds)
+        output = subprocess.run(
+            [sys.executable, __file__, "--worker", name,
+             "--clients", str(args.clients),
+             "--logins", str(args.logins)],
+            env=env, check=True, capture_output=True, text=True, cwd=BACKEND_DIR
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(f"{name:>10}: {result['per_second']:>8} logins/s  {result['per_core']:>8} per core  "
+              f"p50 {result['p50_ms']} ms  p99 {result['p99_ms']} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Measure top-k search latency of the retrieval index at a given size.
+
+The index is filled with random unit vectors (embedding real text would only
+slow the setup down), then queried with embedded questions:
+
+    python benchmarks/bench_retrieval.py --chunks 100000 --queries 500
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from app.retrieval import HashingEmbedder, VectorIndex
+
+QUESTIONS = [
+    "What is gradient descent?",
+    "How does backpropagation update the weights of a neural network?",
+    "Explain the difference between supervised and unsupervised learning",
+    "Why does overfitting happen and how can regularization help?",
+]
+
+def percentile(values, fraction):
+    return values[min(int(len(values) * fraction), len(values) - 1)] * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chunks", type=int, default=100_000)
+    parser.add_argument("--topics", type=int, default=50)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=3)
+    args = parser.parse_args()
+
+    embedder = HashingEmbedder()
+    index = VectorIndex(embedder)
+    rng = np.random.default_rng(0)
+
+    started = time.perf_counter()
+    batch = 1000
+    for content_id, start in enumerate(range(0, args.chunks, batch), 1):
+        size = min(batch, args.chunks - start)
+        vectors = rng.standard_normal((size, embedder.dim)).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        index.add_vectors(vectors, [f"chunk {start + i}" for i in range(size)], content_id % args.topics, content_id)
+    print(f"indexed {len(index)} chunks of dim {embedder.dim} in {time.perf_counter() - started:.2f}s "
+          f"({index.stats()['bytes'] / 1e6:.0f} MB)")
+
+    for label, topic_id in (("all topics", None), ("one topic", 1)):
+        latencies = []
+        for i in range(args.queries):
+            started = time.perf_counter()
+            index.search_vector(embedder(QUESTIONS[i % len(QUESTIONS)]), args.k, topic_id, min_score=-1.0)
+            latencies.append(time.perf_counter() - started)
+        latencies.sort()
+        print(f"{label:>10}: p50 {percentile(latencies, 0.5):.2f} ms  p99 {percentile(latencies, 0.99):.2f} ms "
+              "(embed + search)")
+
+if __name__ == "__main__":
+    main()
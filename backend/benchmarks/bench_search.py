@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Measure /search query latency against a throwaway database with many content rows.
+
+    python benchmarks/bench_search.py --rows 200000 --queries 300
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import random
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WORDS = (
+    "gradient descent backpropagation neural network layer activation loss function optimizer "
+    "regularization overfitting dropout convolution pooling recurrent attention transformer "
+    "embedding tokenizer decision tree forest boosting bagging entropy variance bias kernel "
+    "margin classifier regression cluster centroid dimension projection eigenvector matrix "
+    "vector probability likelihood posterior prior bayes sampling batch epoch learning rate"
+).split()
+# Word frequencies in real text roughly follow Zipf's law: the course vocabulary
+# above is common, then a long tail of rarer terms
+VOCABULARY = WORDS + [f"term{i}" for i in range(20_000)]
+CUM_WEIGHTS = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(VOCABULARY))))
+
+QUERIES = ["gradient descent", "overfit", "attention transformer", "decision tree entropy", "term42", "kern"]
+
+def percentile(values, fraction):
+    return values[min(int(len(values) * fraction), len(values) - 1)] * 1000
+
+async def run(rows: int, queries: int) -> None:
+    sys.path.insert(0, BACKEND_DIR)
+    from app import models, search
+
+    models.create_tables()
+    search.create_search_index(models.engine)
+
+    rng = random.Random(0)
+    started = time.perf_counter()
+    with models.engine.begin() as conn:
+        conn.execute(models.Topic.__table__.insert(), [
+            {"title": f"Topic {i}", "description": " ".join(rng.choices(VOCABULARY, cum_weights=CUM_WEIGHTS, k=12))} for i in range(50)
+        ])
+        batch = 10_000
+        for start in range(0, rows, batch):
+            conn.execute(models.Content.__table__.insert(), [
+                {"topic_id": rng.randint(1, 50), "summary_text": " ".join(rng.choices(VOCABULARY, cum_weights=CUM_WEIGHTS, k=120))}
+                for _ in range(min(batch, rows - start))
+            ])
+    print(f"inserted {rows} content rows (search index kept by triggers) in {time.perf_counter() - started:.1f}s")
+
+    async with models.AsyncSessionLocal() as db:
+        for limit, offset in ((10, 0), (10, 100)):
+            latencies = []
+            for i in range(queries):
+                started = time.perf_counter()
+                await search.search(db, QUERIES[i % len(QUERIES)], limit, offset)
+                latencies.append(time.perf_counter() - started)
+            latencies.sort()
+            print(f"limit {limit} offset {offset:>3}: p50 {percentile(latencies, 0.5):.2f} ms  "
+                  f"p99 {percentile(latencies, 0.99):.2f} ms")
+    await models.async_engine.dispose()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--queries", type=int, default=300)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        asyncio.run(run(args.rows, args.queries))
+
+if __name__ == "__main__":
+    main()
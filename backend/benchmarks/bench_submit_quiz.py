@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Measure quiz submission write throughput with the old and the tuned SQLite settings.
+
+Each configuration runs in a fresh process against a throwaway database,
+with --clients concurrent submitters on one event loop:
+
+    python benchmarks/bench_submit_quiz.py --clients 8 --submissions 200
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CONFIGS = {
+    # What models.py used to do: rollback journal, FULL sync, default cache and pool
+    "baseline": {
+        "SQLITE_JOURNAL_MODE": "DELETE",
+        "SQLITE_SYNCHRONOUS": "FULL",
+        "SQLITE_BUSY_TIMEOUT_MS": "5000",
+        "SQLITE_MMAP_SIZE": "0",
+        "SQLITE_CACHE_SIZE": "-2000",
+        "DB_POOL_SIZE": "5",
+        "DB_MAX_OVERFLOW": "10",
+    },
+    # The defaults in models.py
+    "tuned": {},
+}
+
+async def run_worker(clients: int, submissions: int, questions: int) -> dict:
+    sys.path.insert(0, BACKEND_DIR)
+    from app import models, schemas
+    from app.routes import quiz
+
+    models.create_tables()
+    async with models.AsyncSessionLocal() as db:
+        user = models.User(name="bench", email="bench@example.com", hashed_password="x")
+        topic = models.Topic(title="Benchmark", description="Benchmark topic")
+        db.add_all([user, topic])
+        await db.commit()
+        quizzes = [
+            models.Quiz(topic_id=topic.id, question=f"Q{i}", options=["a", "b", "c", "d"], correct_option=i % 4)
+            for i in range(questions)
+        ]
+        db.add_all(quizzes)
+        await db.commit()
+    submission = schemas.QuizSubmissionList(
+        topic_id=topic.id,
+        submissions=[schemas.QuizSubmission(quiz_id=q.id, selected_option=0) for q in quizzes]
+    )
+
+    errors = []
+    latencies = []
+
+    async def submit_many():
+        for _ in range(submissions):
+            async with models.AsyncSessionLocal() as session:
+                started = time.perf_counter()
+                try:
+                    await quiz.submit_quiz(submission, session, user.id)
+                    latencies.append(time.perf_counter() - started)
+                except Exception as e:
+                    await session.rollback()
+                    errors.append(type(e).__name__)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(submit_many() for _ in range(clients)))
+    elapsed = time.perf_counter() - started
+    await models.async_engine.dispose()
+
+    latencies.sort()
+    return {
+        "submissions": len(latencies),
+        "errors": len(errors),
+        "seconds": round(elapsed, 3),
+        "per_second": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 2) if latencies else None,
+        "p99_ms": round(latencies[int(len(latencies) * 0.99)] * 1000, 2) if latencies else None,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clients", type=int, default=8, help="concurrent submitters")
+    parser.add_argument("--submissions", type=int, default=200, help="submissions per client")
+    parser.add_argument("--questions", type=int, default=10, help="questions per submission")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(asyncio.run(run_worker(args.clients, args.submissions, args.questions))))
+        return
+
+    print(f"{args.clients} clients x {args.submissions} submissions of {args.questions} answers")
+    for name, overrides in CONFIGS.items():
+        with tempfile.TemporaryDirectory() as tmp:
+            env = os.environ.copy()
+            env.update(overrides)
+            env["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+            env["QUIZ_POOL_ENABLED"] = "false"
+            output = subprocess.run(
+                [sys.executable, __file__, "--worker", name,
+                 "--clients", str(args.clients),
+                 "--submissions", str(args.submissions),
+                 "--questions", str(args.questions)],
+                env=env, check=True, capture_output=True, text=True
+            ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(f"{name:>8}: {result['per_second']:>8} submissions/s  "
+              f"p50 {result['p50_ms']} ms  p99 {result['p99_ms']} ms  errors {result['errors']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Hammer a running API with concurrent clients and report requests/sec and latency per endpoint.
+
+Start the server first (GEMINI_CLIENT=fake keeps quiz generation offline), then:
+
+    python benchmarks/load_test.py --base-url http://localhost:8001 --clients 500 --duration 30
+"""
+import argparse
+import asyncio
+import time
+import uuid
+from collections import defaultdict
+
+import httpx
+
+async def setup(client: httpx.AsyncClient, questions: int) -> dict:
+    """Register a user and make sure the first topic has quiz questions to fetch and submit"""
+    email = f"load-{uuid.uuid4().hex[:12]}@example.com"
+    await client.post("/auth/register", json={"name": "Load Test", "email": email, "password": "load-test"})
+    login = await client.post("/auth/login", json={"email": email, "password": "load-test"})
+    login.raise_for_status()
+    headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+    topics = (await client.get("/topics/")).json()
+    if not topics:
+        raise SystemExit("No topics found; run app/init_db.py first")
+    topic_id = topics[0]["id"]
+
+    quizzes = (await client.get(f"/quiz/{topic_id}")).json()
+    if not quizzes:
+        response = await client.post(
+            "/gemini/generate-quiz",
+            json={"topic_id": topic_id, "num_questions": questions},
+            headers=headers
+        )
+        response.raise_for_status()
+        quizzes = (await client.get(f"/quiz/{topic_id}")).json()
+
+    return {
+        "headers": headers,
+        "topic_id": topic_id,
+        "submission": {
+            "topic_id": topic_id,
+            "submissions": [{"quiz_id": q["id"], "selected_option": 0} for q in quizzes[:questions]],
+        },
+    }
+
+async def run_client(client: httpx.AsyncClient, ctx: dict, deadline: float, latencies: dict, errors: dict):
+    requests = [
+        ("GET /topics/", lambda: client.get("/topics/")),
+        ("GET /quiz/{topic_id}", lambda: client.get(f"/quiz/{ctx['topic_id']}")),
+        ("POST /quiz/submit", lambda: client.post("/quiz/submit", json=ctx["submission"], headers=ctx["headers"])),
+    ]
+    while time.perf_counter() < deadline:
+        for name, send in requests:
+            started = time.perf_counter()
+            try:
+                response = await send()
+                ok = response.status_code < 400
+            except httpx.HTTPError:
+                ok = False
+            if ok:
+                latencies[name].append(time.perf_counter() - started)
+            else:
+                errors[name] += 1
+
+def percentile(values, fraction):
+    return values[min(int(len(values) * fraction), len(values) - 1)] * 1000 if values else 0.0
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--base-url", default="http://localhost:8001")
+    parser.add_argument("--clients", type=int, default=500)
+    parser.add_argument("--duration", type=float, default=30, help="seconds")
+    parser.add_argument("--questions", type=int, default=5, help="answers per submission")
+    args = parser.parse_args()
+
+    limits = httpx.Limits(max_connections=args.clients, max_keepalive_connections=args.clients)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=120) as client:
+        ctx = await setup(client, args.questions)
+        latencies = defaultdict(list)
+        errors = defaultdict(int)
+        started = time.perf_counter()
+        deadline = started + args.duration
+        await asyncio.gather(*(
+            run_client(client, ctx, deadline, latencies, errors) for _ in range(args.clients)
+        ))
+        elapsed = time.perf_counter() - started
+
+    print(f"{args.clients} clients for {elapsed:.1f}s against {args.base_url}")
+    print(f"{'endpoint':<22}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for name in sorted(latencies.keys() | errors.keys()):
+        values = sorted(latencies[name])
+        print(f"{name:<22}{len(values) / elapsed:>10.1f}{percentile(values, 0.5):>10.1f}"
+              f"{percentile(values, 0.99):>10.1f}{errors[name]:>8}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,6 +1,7 @@
 import React, { useState, useEffect, useRef } from "react";
 import { GeminiQuery } from "../types";
 import { geminiService } from "../services/gemini";
+import { conversationService } from "../services/conversations";
 
 interface Message {
   id: string;
@@ -13,6 +14,8 @@ const Chat: React.FC = () => {
   const [messages, setMessages] = useState<Message[]>([]);
   const [input, setInput] = useState("");
   const [loading, setLoading] = useState(false);
+  // Server-side session that keeps the history for follow-up questions
+  const [conversationId, setConversationId] = useState<number | null>(null);
   const messagesEndRef = useRef<HTMLDivElement>(null);
 
   const scrollToBottom = () => {
@@ -51,20 +54,47 @@ const Chat: React.FC = () => {
     setLoading(true);
 
     try {
+      let activeConversationId = conversationId;
+      if (activeConversationId === null) {
+        const conversation = await conversationService.createConversation(
+          input.slice(0, 60)
+        );
+        activeConversationId = conversation.id;
+        setConversationId(conversation.id);
+      }
+
       const query: GeminiQuery = {
         prompt: input,
+        conversation_id: activeConversationId,
       };
 
-      const response = await geminiService.queryGemini(query);
-
-      const aiMessage: Message = {
-        id: (Date.now() + 1).toString(),
-        text: response.response,
-        isUser: false,
-        timestamp: new Date(),
-      };
-
-      setMessages((prev) => [...prev, aiMessage]);
+      const aiMessageId = (Date.now() + 1).toString();
+      let started = false;
+
+      await geminiService.streamQuery(query, (token) => {
+        // Show the reply as soon as the first token arrives
+        if (!started) {
+          started = true;
+          setLoading(false);
+          setMessages((prev) => [
+            ...prev,
+            {
+              id: aiMessageId,
+              text: token,
+              isUser: false,
+              timestamp: new Date(),
+            },
+          ]);
+          return;
+        }
+        setMessages((prev) =>
+          prev.map((message) =>
+            message.id === aiMessageId
+              ? { ...message, text: message.text + token }
+              : message
+          )
+        );
+      });
     } catch (error: any) {
       const errorMessage: Message = {
         id: (Date.now() + 1).toString(),
@@ -82,6 +112,7 @@ const Chat: React.FC = () => {
   };
 
   const clearChat = () => {
+    setConversationId(null);
     setMessages([
       {
         id: "1",
@@ -1,11 +1,12 @@
 import React, { useState, useEffect } from "react";
 import { Link } from "react-router-dom";
-import { UserScore, Topic } from "../types";
+import { UserScore, Topic, ProgressSummary } from "../types";
 import { quizService } from "../services/topics";
 import { topicService } from "../services/topics";
 
 const Progress: React.FC = () => {
   const [scores, setScores] = useState<UserScore[]>([]);
+  const [summary, setSummary] = useState<ProgressSummary | null>(null);
   const [topics, setTopics] = useState<Topic[]>([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState("");
@@ -13,11 +14,13 @@ const Progress: React.FC = () => {
   useEffect(() => {
     const fetchData = async () => {
       try {
-        const [scoresData, topicsData] = await Promise.all([
+        const [summaryData, scoresData, topicsData] = await Promise.all([
+          quizService.getProgressSummary(),
           quizService.getUserProgress(),
           topicService.getTopics(),
         ]);
 
+        setSummary(summaryData);
         setScores(scoresData);
         setTopics(topicsData);
       } catch (err: any) {
@@ -75,24 +78,9 @@ const Progress: React.FC = () => {
     );
   }
 
-  // Group scores by topic and get the latest score for each topic
-  const latestScores = scores.reduce((acc, score) => {
-    const existing = acc.find((s) => s.topic_id === score.topic_id);
-    if (!existing || new Date(score.timestamp) > new Date(existing.timestamp)) {
-      acc = acc.filter((s) => s.topic_id !== score.topic_id);
-      acc.push(score);
-    }
-    return acc;
-  }, [] as UserScore[]);
-
-  const averageScore =
-    latestScores.length > 0
-      ? latestScores.reduce(
-          (sum, score) =>
-            sum + getScorePercentage(score.score, score.total_questions),
-          0
-        ) / latestScores.length
-      : 0;
+  // Per-topic latest, best and average scores are aggregated by the server
+  const topicProgress = summary?.topics ?? [];
+  const averageScore = summary?.average_latest_percentage ?? 0;
 
   return (
     <div className="max-w-6xl mx-auto">
@@ -110,7 +98,7 @@ const Progress: React.FC = () => {
         <div className="bg-white rounded-lg shadow-md p-6">
           <div className="text-center">
             <div className="text-3xl font-bold text-blue-600 mb-2">
-              {latestScores.length}
+              {topicProgress.length}
             </div>
             <div className="text-gray-600">Topics Attempted</div>
           </div>
@@ -133,8 +121,8 @@ const Progress: React.FC = () => {
           <div className="text-center">
             <div className="text-3xl font-bold text-green-600 mb-2">
               {
-                latestScores.filter(
-                  (s) => getScorePercentage(s.score, s.total_questions) >= 80
+                topicProgress.filter(
+                  (p) => Math.round(p.latest_percentage) >= 80
                 ).length
               }
             </div>
@@ -149,7 +137,7 @@ const Progress: React.FC = () => {
           Topic Performance
         </h2>
 
-        {latestScores.length === 0 ? (
+        {topicProgress.length === 0 ? (
           <div className="text-center py-12">
             <div className="text-gray-400 text-6xl mb-4">📚</div>
             <p className="text-gray-600 text-lg mb-4">No quiz attempts yet</p>
@@ -162,25 +150,28 @@ const Progress: React.FC = () => {
           </div>
         ) : (
           <div className="space-y-4">
-            {latestScores.map((score) => {
-              const percentage = getScorePercentage(
-                score.score,
-                score.total_questions
-              );
+            {topicProgress.map((progress) => {
+              const percentage = Math.round(progress.latest_percentage);
 
               return (
                 <div
-                  key={score.id}
+                  key={progress.topic_id}
                   className="border border-gray-200 rounded-lg p-4"
                 >
                   <div className="flex justify-between items-start mb-3">
                     <div>
                       <h3 className="font-semibold text-gray-800">
-                        {getTopicName(score.topic_id)}
+                        {getTopicName(progress.topic_id)}
                       </h3>
                       <p className="text-sm text-gray-600">
                         Last attempted:{" "}
-                        {new Date(score.timestamp).toLocaleDateString()}
+                        {new Date(progress.latest_at).toLocaleDateString()}
+                      </p>
+                      <p className="text-sm text-gray-600">
+                        {progress.attempts} attempt
+                        {progress.attempts === 1 ? "" : "s"} · best{" "}
+                        {Math.round(progress.best_percentage)}% · average{" "}
+                        {Math.round(progress.average_percentage)}%
                       </p>
                     </div>
                     <div className="text-right">
@@ -192,7 +183,8 @@ const Progress: React.FC = () => {
                         {percentage}%
                       </div>
                       <div className="text-sm text-gray-600">
-                        {score.score}/{score.total_questions} correct
+                        {progress.latest_score}/{progress.latest_total_questions}{" "}
+                        correct
                       </div>
                     </div>
                   </div>
@@ -208,13 +200,13 @@ const Progress: React.FC = () => {
 
                   <div className="flex space-x-3">
                     <Link
-                      to={`/learn/${score.topic_id}`}
+                      to={`/learn/${progress.topic_id}`}
                       className="text-blue-600 hover:text-blue-800 text-sm"
                     >
                       📚 Review Material
                     </Link>
                     <Link
-                      to={`/quiz/${score.topic_id}`}
+                      to={`/quiz/${progress.topic_id}`}
                       className="text-green-600 hover:text-green-800 text-sm"
                     >
                       🧪 Retake Quiz
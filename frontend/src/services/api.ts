@@ -1,6 +1,6 @@
 import axios from "axios";
 
-const API_BASE_URL = "http://localhost:8001";
+export const API_BASE_URL = "http://localhost:8001";
 
 // Create axios instance
 const api = axios.create({
@@ -0,0 +1,31 @@
+import api from "./api";
+import { Conversation, ConversationMessagePage } from "../types";
+
+export const conversationService = {
+  async createConversation(
+    title?: string,
+    topicId?: number
+  ): Promise<Conversation> {
+    const response = await api.post("/conversations/", {
+      title,
+      topic_id: topicId,
+    });
+    return response.data;
+  },
+
+  async getConversations(): Promise<Conversation[]> {
+    const response = await api.get("/conversations/");
+    return response.data;
+  },
+
+  // Pages run newest to oldest; pass next_before to load older messages
+  async getMessages(
+    conversationId: number,
+    before?: number
+  ): Promise<ConversationMessagePage> {
+    const response = await api.get(`/conversations/${conversationId}/messages`, {
+      params: before ? { before } : undefined,
+    });
+    return response.data;
+  },
+};
@@ -1,12 +1,90 @@
-import api from "./api";
+import api, { API_BASE_URL } from "./api";
 import { GeminiQuery, GeminiResponse, Quiz } from "../types";
 
+interface StreamEvent {
+  event: string;
+  data: any;
+}
+
+// Split a buffered Server-Sent Events body into complete messages
+const parseEvents = (buffer: string): { events: StreamEvent[]; rest: string } => {
+  const messages = buffer.split("\n\n");
+  const rest = messages.pop() ?? "";
+  const events = messages
+    .filter((message) => message.trim())
+    .map((message) => {
+      let event = "message";
+      const dataLines: string[] = [];
+      for (const line of message.split("\n")) {
+        if (line.startsWith("event:")) {
+          event = line.slice(6).trim();
+        } else if (line.startsWith("data:")) {
+          dataLines.push(line.slice(5).trim());
+        }
+      }
+      return { event, data: JSON.parse(dataLines.join("\n") || "{}") };
+    });
+  return { events, rest };
+};
+
 export const geminiService = {
   async queryGemini(query: GeminiQuery): Promise<GeminiResponse> {
     const response = await api.post("/gemini/query", query);
     return response.data;
   },
 
+  // Axios buffers whole responses in the browser, so streaming uses fetch
+  async streamQuery(
+    query: GeminiQuery,
+    onToken: (token: string) => void
+  ): Promise<GeminiResponse> {
+    const token = localStorage.getItem("token");
+    const response = await fetch(`${API_BASE_URL}/gemini/query/stream`, {
+      method: "POST",
+      headers: {
+        "Content-Type": "application/json",
+        Accept: "text/event-stream",
+        ...(token ? { Authorization: `Bearer ${token}` } : {}),
+      },
+      body: JSON.stringify(query),
+    });
+
+    if (response.status === 401) {
+      localStorage.removeItem("token");
+      window.location.href = "/login";
+    }
+    if (!response.ok || !response.body) {
+      const body = await response.json().catch(() => ({}));
+      throw { response: { data: body } };
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+    let text = "";
+
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+
+      const parsed = parseEvents(buffer);
+      buffer = parsed.rest;
+      for (const { event, data } of parsed.events) {
+        if (event === "error") {
+          throw { response: { data } };
+        }
+        if (event === "done") {
+          return { response: text, topic_id: data.topic_id ?? undefined };
+        }
+        text += data.token;
+        onToken(data.token);
+      }
+    }
+
+    return { response: text, topic_id: query.topic_id };
+  },
+
   async generateQuiz(
     topicId: number,
     numQuestions: number = 5
@@ -18,8 +96,13 @@ export const geminiService = {
     return response.data;
   },
 
-  async explainTopic(topicId: number): Promise<GeminiResponse> {
-    const response = await api.post(`/gemini/explain-topic/${topicId}`);
+  async explainTopic(
+    topicId: number,
+    refresh: boolean = false
+  ): Promise<GeminiResponse> {
+    const response = await api.post(`/gemini/explain-topic/${topicId}`, null, {
+      params: refresh ? { refresh: true } : undefined,
+    });
     return response.data;
   },
 };
@@ -5,6 +5,7 @@ import {
   QuizQuestion,
   UserScore,
   QuizSubmission,
+  ProgressSummary,
 } from "../types";
 
 export const topicService = {
@@ -57,4 +58,9 @@ export const quizService = {
     const response = await api.get("/quiz/progress/");
     return response.data;
   },
+
+  async getProgressSummary(): Promise<ProgressSummary> {
+    const response = await api.get("/quiz/progress/summary");
+    return response.data;
+  },
 };
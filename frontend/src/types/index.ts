@@ -48,6 +48,26 @@ export interface UserScore {
   timestamp: string;
 }
 
+export interface TopicProgress {
+  topic_id: number;
+  attempts: number;
+  average_percentage: number;
+  best_score: number;
+  best_total_questions: number;
+  best_percentage: number;
+  latest_score: number;
+  latest_total_questions: number;
+  latest_percentage: number;
+  latest_at: string;
+}
+
+export interface ProgressSummary {
+  topics: TopicProgress[];
+  topics_attempted: number;
+  total_attempts: number;
+  average_latest_percentage: number;
+}
+
 export interface LoginCredentials {
   email: string;
   password: string;
@@ -67,6 +87,7 @@ export interface AuthResponse {
 export interface GeminiQuery {
   prompt: string;
   topic_id?: number;
+  conversation_id?: number;
 }
 
 export interface GeminiResponse {
@@ -74,6 +95,28 @@ export interface GeminiResponse {
   topic_id?: number;
 }
 
+export interface Conversation {
+  id: number;
+  title?: string;
+  topic_id?: number;
+  summary?: string;
+  created_at: string;
+  updated_at: string;
+}
+
+export interface ConversationMessage {
+  id: number;
+  conversation_id: number;
+  role: "user" | "assistant";
+  content: string;
+  created_at: string;
+}
+
+export interface ConversationMessagePage {
+  messages: ConversationMessage[];
+  next_before?: number;
+}
+
 export interface AuthContextType {
   user: User | null;
   login: (credentials: LoginCredentials) => Promise<void>;